@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket per client: ``rate`` requests per second, bursts up to ``burst``."""
+
+    def __init__(self, rate=1.0, burst=3, max_clients=4096):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self.buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            if len(self.buckets) > self.max_clients:
+                self._prune(now)
+        return wait
+
+    def active(self, window=10.0):
+        now = time.monotonic()
+        return sum(1 for _, last in list(self.buckets.values()) if now - last <= window)
+
+    def _prune(self, now):
+        # Drop clients whose buckets have refilled completely
+        full = self.burst / self.rate
+        for key in [k for k, (_, last) in self.buckets.items() if now - last > full]:
+            del self.buckets[key]
+
+
+class AdmissionGate:
+    """Bounds how many recognitions run at once and how many may wait for a slot.
+
+    Anything beyond ``max_in_flight + max_waiting`` is turned away immediately
+    instead of piling up until the worker timeout kills it.
+    """
+
+    def __init__(self, max_in_flight=1, max_waiting=4, max_wait=10.0):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.ewma_seconds = 0.5
+
+    @property
+    def depth(self):
+        return self.in_flight + self.waiting
+
+    def enter(self):
+        deadline = time.monotonic() + self.max_wait
+        with self.cond:
+            if self.in_flight >= self.max_in_flight and self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self.cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def exit(self, elapsed):
+        with self.cond:
+            self.in_flight -= 1
+            self.ewma_seconds = 0.8 * self.ewma_seconds + 0.2 * elapsed
+            self.cond.notify()
+
+    def retry_after(self):
+        # Roughly how long until everything ahead of a new request has drained
+        return max(1, math.ceil((self.depth + 1) * self.ewma_seconds / self.max_in_flight))
+
+    def suggested_interval(self, clients):
+        # Spread the gate's throughput across the cameras currently sending
+        per_frame = self.ewma_seconds / self.max_in_flight
+        return round(max(1.0, per_frame * max(1, clients) * 1.5), 1)
+
+    def status(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queue_depth": self.depth,
+            "capacity": self.max_in_flight + self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.ewma_seconds, 3),
+        }
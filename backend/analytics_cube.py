@@ -0,0 +1,264 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from archive import attendance_tables
+from timetable import FIRST_HOUR, PERIODS, WEEKDAYS, period_for_time
+
+# BIT_TABLE[b, p] is 1 when byte value b has period p + 1 set, so a histogram
+# of byte values times this table gives per-period totals in one matmul.
+BIT_TABLE = ((np.arange(256)[:, None] >> np.arange(PERIODS)) & 1).astype(np.int64)
+
+# One row per student-day with its period bits ORed together in SQL (a sum
+# of distinct powers of two), so a rebuild never touches individual marks in
+# Python. CAST keeps the leading hour of HH:MM:SS and the modulo wraps it like
+# period_for_hour(); the '+0 days' round trip drops impossible dates such as
+# 2025-02-30. Each table is grouped on its own so the (name, date) index
+# spares SQLite a sort, which it cannot use through the attendance_all view.
+PERIOD_MASKS_SQL = """
+    SELECT name, date, SUM(DISTINCT 1 << (((CAST(time AS INTEGER) - {first}) % {n} + {n}) % {n}))
+    FROM {table}
+    WHERE name <> '' AND date(date, '+0 days') = date AND time GLOB '[0-9]*'
+    GROUP BY name, date
+"""
+
+
+def period_masks(conn):
+    """(name, date, period bitmask) for every student-day with a mark.
+
+    A day can briefly have rows in both tables while an edit to a closed month
+    is being archived, so the same (name, date) may come back twice.
+    """
+    rows = []
+    for table in attendance_tables(conn):
+        rows.extend(conn.execute(PERIOD_MASKS_SQL.format(first=FIRST_HOUR, n=PERIODS, table=table)))
+    return rows
+
+
+def weekdays_of(dates):
+    # 1970-01-01 was a Thursday (weekday 3)
+    return ((np.asarray(dates, dtype="datetime64[D]").astype(np.int64) + 3) % 7).astype(np.int8)
+
+
+class AttendanceCube:
+    """Attendance as a student x date array of period bitmasks.
+
+    One uint8 per student-date, bit ``p - 1`` set when the student was marked
+    in period p, so the full cube is students x dates bytes. Every analytics
+    answer is a reduction over it. Rows and columns are appended in place as
+    new students and dates show up; any other kind of write calls invalidate()
+    and the cube is rebuilt from SQL on next use.
+
+    A rebuild reads and assembles the new arrays without holding ``lock`` and
+    swaps them in at the end, so live marks never wait on it; marks that
+    arrive meanwhile are replayed onto the new arrays.
+    """
+
+    def __init__(self, load_masks=None):
+        self.load_masks = load_masks
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.loaded = False
+        self.generation = 0
+        self.pending = None
+        self._swap(self._build([], [], np.zeros((0, 0), dtype=np.uint8)))
+
+    @staticmethod
+    def _build(students, dates, bits):
+        state = {
+            "students": list(students),
+            "student_index": {n: i for i, n in enumerate(students)},
+            "dates": list(dates),
+            "date_index": {d: j for j, d in enumerate(dates)},
+            "weekdays": np.zeros(max(16, len(dates)), dtype=np.int8),
+            "bits": np.zeros((max(16, len(students)), max(16, len(dates))), dtype=np.uint8),
+        }
+        state["weekdays"][:len(dates)] = weekdays_of(dates)
+        state["bits"][:len(students), :len(dates)] = bits
+        return state
+
+    def _swap(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    # ---- building ----
+
+    def _grow(self, rows, cols):
+        r, c = self.bits.shape
+        if rows <= r and cols <= c:
+            return
+        # Double whichever axis overflowed so appends stay amortised O(1)
+        new_r = r if rows <= r else max(rows, r * 2)
+        new_c = c if cols <= c else max(cols, c * 2)
+        bits = np.zeros((new_r, new_c), dtype=np.uint8)
+        bits[:r, :c] = self.bits
+        self.bits = bits
+        if cols > len(self.weekdays):
+            weekdays = np.zeros(bits.shape[1], dtype=np.int8)
+            weekdays[:len(self.weekdays)] = self.weekdays
+            self.weekdays = weekdays
+
+    def _student(self, name):
+        i = self.student_index.get(name)
+        if i is None:
+            i = self.student_index[name] = len(self.students)
+            self.students.append(name)
+            self._grow(len(self.students), len(self.dates))
+        return i
+
+    def _date(self, date):
+        j = self.date_index.get(date)
+        if j is None:
+            j = self.date_index[date] = len(self.dates)
+            self.dates.append(date)
+            self._grow(len(self.students), len(self.dates))
+            self.weekdays[j] = datetime.strptime(date, "%Y-%m-%d").weekday()
+        return j
+
+    @classmethod
+    def _build_from_masks(cls, rows):
+        students = sorted({row[0] for row in rows})
+        dates = sorted({row[1] for row in rows})
+        si = {n: i for i, n in enumerate(students)}
+        dj = {d: j for j, d in enumerate(dates)}
+        bits = np.zeros((len(students), len(dates)), dtype=np.uint8)
+        np.bitwise_or.at(bits, (np.fromiter((si[row[0]] for row in rows), np.int64, len(rows)),
+                                np.fromiter((dj[row[1]] for row in rows), np.int64, len(rows))),
+                         np.fromiter((row[2] for row in rows), np.uint8, len(rows)))
+        return cls._build(students, dates, bits)
+
+    def load_matrix(self, students, dates, bits):
+        """Replace the cube with a ready-made students x dates bitmask matrix."""
+        state = self._build(students, dates, bits)
+        with self.lock:
+            self._swap(state)
+            self.loaded = True
+
+    def load(self):
+        """Rebuild from SQL; marks taken while it runs are kept in ``pending``."""
+        with self.lock:
+            generation = self.generation
+            self.pending = []
+        try:
+            state = self._build_from_masks(self.load_masks())
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+        with self.lock:
+            self._swap(state)
+            # Marks are ORed in, so replaying one the SQL read already saw is harmless
+            for name, date, time in self.pending:
+                self._mark(name, date, time)
+            self.pending = None
+            # An invalidate() during the read means this copy may already be stale
+            self.loaded = self.generation == generation
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self.build_lock:
+                if not self.loaded:
+                    self.load()
+
+    def _mark(self, name, date, time):
+        i = self._student(name)
+        j = self._date(date)
+        self.bits[i, j] |= 1 << (period_for_time(time) - 1)
+
+    def mark(self, name, date, time):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((name, date, time))
+            elif self.loaded:
+                self._mark(name, date, time)
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.loaded = False
+
+    # ---- queries ----
+    # Each query loads the cube (if needed) before taking the lock, so a
+    # rebuild never runs while holding it.
+
+    def _view(self):
+        return self.bits[:len(self.students), :len(self.dates)]
+
+    def nbytes(self):
+        return self.bits.nbytes + self.weekdays.nbytes
+
+    def total_days(self):
+        self.ensure_loaded()
+        return len(self.dates)
+
+    def present_days(self):
+        self.ensure_loaded()
+        with self.lock:
+            return np.count_nonzero(self._view(), axis=1)
+
+    def _percentages(self):
+        total = len(self.dates)
+        present = np.count_nonzero(self._view(), axis=1)
+        if total == 0:
+            return present.astype(np.float64)
+        return present * 100.0 / total
+
+    def percentages(self):
+        self.ensure_loaded()
+        with self.lock:
+            return self._percentages()
+
+    def below(self, threshold=75.0):
+        self.ensure_loaded()
+        with self.lock:
+            pct = self._percentages()
+            idx = np.flatnonzero(pct < threshold)
+            return [{"name": self.students[i], "percentage": round(float(pct[i]), 2)} for i in idx]
+
+    def student_summary(self, name):
+        self.ensure_loaded()
+        with self.lock:
+            total = len(self.dates)
+            i = self.student_index.get(name)
+            if i is None:
+                return 0, total, sorted(self.dates)
+            row = self._view()[i]
+            leave = [self.dates[j] for j in np.flatnonzero(row == 0)]
+            return int(np.count_nonzero(row)), total, sorted(leave)
+
+    def present_on(self, date):
+        self.ensure_loaded()
+        with self.lock:
+            view = self._view()
+            j = self.date_index.get(date)
+            return int(np.count_nonzero(view[:, j])) if j is not None else 0
+
+    def period_counts(self, name=None):
+        self.ensure_loaded()
+        with self.lock:
+            view = self._view()
+            if name is not None:
+                i = self.student_index.get(name)
+                view = view[i:i + 1] if i is not None else view[:0]
+            return np.bincount(view.ravel(), minlength=256) @ BIT_TABLE
+
+    def most_skipped_period(self):
+        counts = self.period_counts()
+        if not counts.any():
+            return None
+        return int(np.argmin(counts)) + 1
+
+    def weekday_heatmap(self, name=None):
+        self.ensure_loaded()
+        with self.lock:
+            view = self._view()
+            weekdays = self.weekdays[:len(self.dates)]
+            if name is not None:
+                i = self.student_index.get(name)
+                view = view[i:i + 1] if i is not None else view[:0]
+            heatmap = {}
+            for wd, day in enumerate(WEEKDAYS[:6]):
+                counts = np.bincount(view[:, weekdays == wd].ravel(), minlength=256) @ BIT_TABLE
+                heatmap[day] = {p + 1: int(counts[p]) for p in range(PERIODS)}
+            return heatmap
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, make_response, Response
 from flask_cors import CORS
 import cv2
 import numpy as np
@@ -9,24 +9,42 @@ import sqlite3
 import base64
 import jwt
 from functools import wraps
+from werkzeug.http import parse_etags
+from werkzeug.middleware.proxy_fix import ProxyFix
 import re
+import threading
+import math
+from time import monotonic
+from admission import AdmissionGate, RateLimiter
+from analytics_cube import AttendanceCube, period_masks
+from archive import all_months, archive_month, connect as archive_connect, table_for_date, table_for_month
+from auth import Roster, TokenVerifier, UserContext
+from chatbot import AnswerCache, ChatLogWriter, answer_admin, answer_student
+from crop_cache import CropCache, crop_hash
+from detectors import create_detector
+from diagnostics import AllocationTracer, SamplingProfiler, process_memory, sqlite_memory
+from jobs import JobManager, rename_profile, write_encodings
+from reports import GridCache, attendance_grid, month_range
+from shards import ShardedGallery, parse_addresses, start_local_shards
+from static_assets import StaticManifest
 
 frontend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
-app = Flask(__name__, static_folder=frontend_dir, static_url_path="/")
+# Frontend files are served from an in-memory manifest instead of Flask's static folder
+app = Flask(__name__, static_folder=None)
 app.config['SECRET_KEY'] = 'smart_attendance_secret_key'
-CORS(app, resources={r"/api/*": {"origins": "*"}, r"/*": {"origins": "*"}})
+# Reverse proxies in front of the app (Railway and Heroku have one). Only that
+# many X-Forwarded-For entries are trusted; 0 means the app is reached directly.
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', '0'))
+if PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
+static_manifest = StaticManifest(frontend_dir, max_age=int(os.environ.get('STATIC_MAX_AGE', '3600')))
+STATIC_ENDPOINTS = ("index", "catch_all")
 
 @app.before_request
 def before_request():
     return None
 
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
-
 @app.errorhandler(Exception)
 def handle_error(e):
     return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -39,16 +57,16 @@ def token_required(f):
             return jsonify({'status': 'error', 'message': 'Token is missing'}), 401
         try:
             token = token.split(" ")[1] if " " in token else token
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = data
+            current_user = token_verifier.verify(token)
         except Exception as e:
             return jsonify({'status': 'error', 'message': 'Token is invalid'}), 401
+        g.user = UserContext(current_user, roster)
         return f(current_user, *args, **kwargs)
     return decorated
 
 @app.route("/")
 def index():
-    return app.send_static_file("index.html")
+    return static_manifest.response(static_manifest.get("index.html"), request)
 
 @app.route("/health")
 def health():
@@ -74,18 +92,87 @@ def test_endpoints():
 DATA_PATH = "data"
 ENCODING_FILE = "data/encodings.pkl"
 DB_FILE = "attendance.db"
+# Pre-cropped face tiles: a few per frame, each a few KB of JPEG
+MAX_TILES = 32
+MAX_TILE_B64 = 256 * 1024
+# Closed months are moved out of the live table into this attached database
+ARCHIVE_FILE = "data/attendance_archive.db"
+ARCHIVE_KEEP_MONTHS = int(os.environ.get('ARCHIVE_KEEP_MONTHS', '6'))
+# Gallery matching across shard processes: RECOGNITION_SHARDS=N starts N local
+# shards, RECOGNITION_SHARD_ADDRESSES=host:port,... uses shards on other nodes
+RECOGNITION_SHARDS = int(os.environ.get('RECOGNITION_SHARDS', '0'))
+RECOGNITION_SHARD_ADDRESSES = os.environ.get('RECOGNITION_SHARD_ADDRESSES', '')
+# Required with RECOGNITION_SHARD_ADDRESSES; local shards get a random key per run
+RECOGNITION_SHARD_KEY = os.environ.get('RECOGNITION_SHARD_KEY', '')
+RECOGNITION_TOP_K = int(os.environ.get('RECOGNITION_TOP_K', '3'))
+# Relaxed threshold to restore baseline functionality
+MATCH_THRESHOLD = 1000.0
 
 os.makedirs(DATA_PATH, exist_ok=True)
 
 attendance_active = False
 
-# Fallback basic face detection using Haar Cascades
-print(f"DEBUG: Loading cascade from {cv2.data.haarcascades}")
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-if face_cascade.empty():
-    print("DEBUG: Cascade loaded empty! Check cv2.data.haarcascades path.")
-else:
-    print("DEBUG: Cascade loaded successfully.")
+token_verifier = TokenVerifier(app.config['SECRET_KEY'])
+roster = Roster(DB_FILE)
+
+# Recognition admission control: per-client rate limit plus a bounded queue.
+# Frames running or waiting in the gate each hold a gunicorn thread, so the
+# gate is sized from WEB_THREADS (keep it equal to --threads) and always
+# leaves at least one thread for dashboards and health checks.
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))
+RECOGNITION_CONCURRENCY = max(1, min(int(os.environ.get('RECOGNITION_CONCURRENCY', '1')), WEB_THREADS - 1))
+RECOGNITION_QUEUE_LIMIT = max(0, WEB_THREADS - 1 - RECOGNITION_CONCURRENCY)
+RECOGNITION_QUEUE = min(int(os.environ.get('RECOGNITION_QUEUE', str(RECOGNITION_QUEUE_LIMIT))), RECOGNITION_QUEUE_LIMIT)
+if RECOGNITION_CONCURRENCY + RECOGNITION_QUEUE >= WEB_THREADS:
+    print(f"DEBUG: WEB_THREADS={WEB_THREADS} leaves no thread outside recognition, raise --threads")
+recognition_limiter = RateLimiter(rate=float(os.environ.get('RECOGNITION_RATE', '1')),
+                                  burst=int(os.environ.get('RECOGNITION_BURST', '3')))
+recognition_gate = AdmissionGate(max_in_flight=RECOGNITION_CONCURRENCY,
+                                 max_waiting=RECOGNITION_QUEUE,
+                                 max_wait=float(os.environ.get('RECOGNITION_MAX_WAIT', '10')))
+
+def client_key():
+    client_id = request.headers.get('X-Client-Id')
+    if client_id:
+        return client_id
+    # Never X-Forwarded-For directly: any caller could send a new one per
+    # request. ProxyFix rewrites remote_addr from the trusted hops only.
+    return request.remote_addr or ''
+
+def queue_headers(response):
+    response.headers['X-Queue-Depth'] = str(recognition_gate.depth)
+    response.headers['X-Suggested-Interval'] = str(recognition_gate.suggested_interval(recognition_limiter.active()))
+    return response
+
+def shed(status, message, retry_after):
+    response = make_response(jsonify({"status": "error", "message": message,
+                                      "retry_after": retry_after, "queue_depth": recognition_gate.depth}), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return queue_headers(response)
+
+def admission_controlled(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        wait = recognition_limiter.acquire(client_key())
+        if wait:
+            return shed(429, "Too many frames, slow down", math.ceil(wait))
+        if not recognition_gate.enter():
+            return shed(503, "Recognition queue is full", recognition_gate.retry_after())
+        start = monotonic()
+        try:
+            response = make_response(f(*args, **kwargs))
+        finally:
+            recognition_gate.exit(monotonic() - start)
+        return queue_headers(response)
+    return decorated
+
+# Face detection backend, chosen with FACE_DETECTOR (haar, lbp or dnn)
+try:
+    face_detector = create_detector()
+except Exception as e:
+    print(f"DEBUG: Failed to load face detector: {e}. Falling back to Haar cascade.")
+    face_detector = create_detector("haar")
+print(f"DEBUG: Face detector '{face_detector.name}' loaded successfully.")
 
 # ----------------- DB -----------------
 def init_db():
@@ -99,6 +186,8 @@ def init_db():
             time TEXT
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_name_date ON attendance (name, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_time ON attendance (date, time)")
     c.execute("""
         CREATE TABLE IF NOT EXISTS students (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -128,13 +217,20 @@ def init_db():
     conn.commit()
     conn.close()
 
+def history_db(timeout=5.0):
+    # Live table as "attendance", archived months as archive.attendance,
+    # and both together as the temp view "attendance_all"
+    return archive_connect(DB_FILE, ARCHIVE_FILE, timeout)
+
 init_db()
+history_db().close()
 
 ADMIN_USER = os.environ.get('ADMIN_USER', 'sriram.dev')
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '1234')
 
 # ----------------- Load Encodings -----------------
 known_encodings = {}
+gallery_lock = threading.Lock()
 
 print(f"DEBUG: Checking for encoding file at {ENCODING_FILE}")
 if os.path.exists(ENCODING_FILE):
@@ -149,13 +245,115 @@ else:
     print("DEBUG: No encoding file found, starting fresh")
 
 def save_encodings():
-    with open(ENCODING_FILE, "wb") as f:
-        pickle.dump(known_encodings, f)
+    write_encodings(ENCODING_FILE, known_encodings)
+
+def update_gallery(mutate):
+    with gallery_lock:
+        before = dict(known_encodings)
+        mutate(known_encodings)
+        save_encodings()
+        crop_cache.invalidate()
+        if sharded_gallery is not None:
+            sync_shards(before, known_encodings)
+
+# ----------------- Recognition Shards -----------------
+sharded_gallery = None
+shards_stale = False
+
+def sync_shards(before, after):
+    # Push only what the mutation changed; the coordinator rebalances on removal
+    global shards_stale
+    changed = {n: e for n, e in after.items() if before.get(n) is not e}
+    removed = [n for n in before if n not in after]
+    try:
+        if changed:
+            sharded_gallery.enroll(changed)
+        if removed:
+            sharded_gallery.remove(removed)
+    except Exception as e:
+        print(f"DEBUG: Failed to update recognition shards, will reload: {e}")
+        shards_stale = True
+
+def shard_match(encodings):
+    """Names for each encoding via the shards, or None to match in-process."""
+    global shards_stale
+    if sharded_gallery is None:
+        return None
+    try:
+        if shards_stale:
+            with gallery_lock:
+                sharded_gallery.load(known_encodings)
+            shards_stale = False
+        candidates = sharded_gallery.search(list(encodings))
+    except Exception as e:
+        print(f"DEBUG: Recognition shards unavailable, matching in-process: {e}")
+        shards_stale = True
+        return None
+    return [c[0][1] if c and c[0][0] < MATCH_THRESHOLD else "Unknown" for c in candidates]
+
+if RECOGNITION_SHARDS > 0 or RECOGNITION_SHARD_ADDRESSES:
+    try:
+        if RECOGNITION_SHARD_ADDRESSES:
+            if not RECOGNITION_SHARD_KEY:
+                raise ValueError("RECOGNITION_SHARD_KEY must be set to use RECOGNITION_SHARD_ADDRESSES")
+            shard_addresses = parse_addresses(RECOGNITION_SHARD_ADDRESSES)
+            shard_key = RECOGNITION_SHARD_KEY.encode()
+        else:
+            shard_addresses, shard_key = start_local_shards(RECOGNITION_SHARDS)
+        sharded_gallery = ShardedGallery(shard_addresses, shard_key, k=RECOGNITION_TOP_K)
+        sharded_gallery.load(known_encodings)
+        print(f"DEBUG: Gallery of {len(known_encodings)} split across {len(shard_addresses)} recognition shards")
+    except Exception as e:
+        print(f"DEBUG: Failed to start recognition shards: {e}. Matching in-process.")
+        sharded_gallery = None
+
+chat_cache = AnswerCache(ttl=float(os.environ.get('CHAT_CACHE_TTL', '30')))
+chat_log_writer = ChatLogWriter(DB_FILE)
+grid_cache = GridCache()
+# Recent crop -> identity per camera, so a student sitting still isn't re-matched every poll
+crop_cache = CropCache(ttl=float(os.environ.get('CROP_CACHE_TTL', '30')),
+                       max_distance=int(os.environ.get('CROP_CACHE_MAX_DISTANCE', '6')))
+
+def load_attendance_masks():
+    conn = history_db()
+    try:
+        return period_masks(conn)
+    finally:
+        conn.close()
+
+attendance_cube = AttendanceCube(load_attendance_masks)
+
+def attendance_marked(name, date, time_str):
+    # Live recognition path: the cube takes the new mark in place
+    attendance_cube.mark(name, date, time_str)
+    chat_cache.invalidate()
+    grid_cache.invalidate(date[:7])
+
+def attendance_changed(*months):
+    # Called after every write to attendance or the student roster. Pass the
+    # YYYY-MM months touched when known; no months means anything may have changed.
+    chat_cache.invalidate()
+    crop_cache.invalidate()
+    attendance_cube.invalidate()
+    if months:
+        for month in months:
+            grid_cache.invalidate(month)
+    else:
+        roster.invalidate()
+        grid_cache.invalidate()
+
+job_manager = JobManager(history_db, update_gallery, on_change=attendance_changed)
+if ARCHIVE_KEEP_MONTHS > 0:
+    job_manager.submit("archive", keep_months=ARCHIVE_KEEP_MONTHS)
 
-def base64_to_image(base64_str):
-    img_data = base64.b64decode(base64_str.split(",")[1])
+def base64_to_image(base64_str, flags=cv2.IMREAD_COLOR):
+    # Accepts data URLs as sent by the browser, or bare base64
+    img_data = base64.b64decode(base64_str.split(",")[-1])
     np_arr = np.frombuffer(img_data, np.uint8)
-    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(np_arr, flags)
+    if img is None:
+        raise ValueError("could not decode image")
+    return img
 
 def get_face_encoding(img, face_rect):
     x, y, w, h = face_rect
@@ -163,6 +361,79 @@ def get_face_encoding(img, face_rect):
     face_resized = cv2.resize(face_img, (100, 100))
     return face_resized.flatten() / 255.0
 
+def match_encoding(enc, names_list, enc_list):
+    distances = []
+    valid_names = []
+    for n, e in zip(names_list, enc_list):
+        if hasattr(e, 'shape') and e.shape == enc.shape:
+            distances.append(np.linalg.norm(e - enc))
+            valid_names.append(n)
+
+    if distances:
+        min_dist_idx = np.argmin(distances)
+        # Confidence score mapping: 32.0 distance is around 85% confidence, 40 is 70%
+        raw_dist = distances[min_dist_idx]
+        confidence = max(0, min(100, 100 - (raw_dist * 2)))
+
+        if raw_dist < MATCH_THRESHOLD:
+            return valid_names[min_dist_idx]
+    return "Unknown"
+
+def mark_attendance(name):
+    now = datetime.now()
+    date = now.strftime("%Y-%m-%d")
+    time = now.strftime("%H:%M:%S")
+
+    # Store attendance without 5-minute lock so user can test anytime
+    time_minute = now.strftime("%H:%M")
+
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT * FROM attendance WHERE name=? AND date=? AND time LIKE ?", (name, date, f"{time_minute}%"))
+    if not c.fetchone():
+        c.execute("INSERT INTO attendance (name, date, time) VALUES (?, ?, ?)",
+                  (name, date, time))
+        conn.commit()
+        attendance_marked(name, date, time)
+    conn.close()
+
+def match_all(encodings):
+    matches = shard_match(encodings)
+    if matches is None:
+        # Snapshot once so background jobs can update the gallery mid-request
+        gallery = list(known_encodings.items())
+        names_list = [n for n, _ in gallery]
+        enc_list = [e for _, e in gallery]
+        matches = [match_encoding(enc, names_list, enc_list) if enc_list else "Unknown" for enc in encodings]
+    return matches
+
+def recognize(encodings, session=None):
+    """Match face encodings against the gallery and mark attendance for each hit.
+
+    Crops this session has seen recently map straight to their last identity;
+    only the rest go to the gallery.
+    """
+    keys = [crop_hash(enc) for enc in encodings]
+    cached = [crop_cache.get(session, key) for key in keys]
+    misses = [i for i, entry in enumerate(cached) if entry is None]
+    matched = dict(zip(misses, match_all([encodings[i] for i in misses]))) if misses else {}
+
+    minute = datetime.now().strftime("%Y-%m-%d %H:%M")
+    names = []
+    for i, key in enumerate(keys):
+        if cached[i] is not None:
+            name, marked_minute, _ = cached[i]
+        else:
+            name, marked_minute = matched[i], None
+        # A hit already marked this minute needs neither the match nor the dedup query
+        if name != "Unknown" and marked_minute != minute:
+            mark_attendance(name)
+            marked_minute = minute
+        if cached[i] is None or marked_minute != cached[i][1]:
+            crop_cache.put(session, key, name, marked_minute)
+        names.append(name)
+    return names
+
 # ----------------- Routes -----------------
 
 @app.route("/start_attendance", methods=["POST"])
@@ -190,13 +461,12 @@ def register():
     img = base64_to_image(image_b64)
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-    faces = face_cascade.detectMultiScale(gray, 1.1, 3)
+    faces = face_detector.detect(gray)
     if len(faces) == 0:
         return jsonify({"status": "error", "message": "Show exactly one face"}), 400
 
     encoding = get_face_encoding(gray, faces[0])
-    known_encodings[name] = encoding
-    save_encodings()
+    update_gallery(lambda encodings: encodings.__setitem__(name, encoding))
 
     # ensure student record exists
     conn = sqlite3.connect(DB_FILE)
@@ -207,16 +477,21 @@ def register():
         conn.commit()
     finally:
         conn.close()
+    attendance_changed()
 
     return jsonify({"status": "success", "message": f"{name} registered"})
 
 @app.route("/attendance", methods=["POST"])
+@admission_controlled
 def attendance():
     global attendance_active
     if not attendance_active:
         return jsonify({"status": "error", "message": "Attendance not started"}), 403
 
-    data = request.json
+    return frame_attendance(request.json)
+
+def frame_attendance(data):
+    # Full-frame path: decode, detect, then encode every face found
     image_b64 = data.get("image")
 
     if not image_b64:
@@ -228,57 +503,64 @@ def attendance():
     except Exception as e:
         return jsonify({"status": "error", "message": f"Image error: {str(e)}"}), 400
 
-    faces = face_cascade.detectMultiScale(gray, 1.1, 3)
+    faces = face_detector.detect(gray)
 
     if len(faces) == 0:
         return jsonify({"status": "error", "message": "No face detected"})
 
-    results = []
-    names_list = list(known_encodings.keys())
-    enc_list = list(known_encodings.values())
+    encodings = [get_face_encoding(gray, face) for face in faces]
+    return jsonify({"status": "success", "recognized": [n for n in recognize(encodings, client_key()) if n != "Unknown"]})
 
-    for face in faces:
-        enc = get_face_encoding(gray, face)
-        name = "Unknown"
-        
-        if len(enc_list) > 0:
-            distances = []
-            valid_names = []
-            for n, e in zip(names_list, enc_list):
-                if hasattr(e, 'shape') and e.shape == enc.shape:
-                    distances.append(np.linalg.norm(e - enc))
-                    valid_names.append(n)
-            
-            if distances:
-                min_dist_idx = np.argmin(distances)
-                # Confidence score mapping: 32.0 distance is around 85% confidence, 40 is 70%
-                raw_dist = distances[min_dist_idx]
-                confidence = max(0, min(100, 100 - (raw_dist * 2)))
-
-                # Relaxed threshold to restore baseline functionality
-                if raw_dist < 1000.0:  
-                    name = valid_names[min_dist_idx]
-
-                    now = datetime.now()
-                    date = now.strftime("%Y-%m-%d")
-                    time = now.strftime("%H:%M:%S")
-                    
-                    # Store attendance without 5-minute lock so user can test anytime
-                    time_minute = now.strftime("%H:%M")
-                    
-                    conn = sqlite3.connect(DB_FILE)
-                    c = conn.cursor()
-                    c.execute("SELECT * FROM attendance WHERE name=? AND date=? AND time LIKE ?", (name, date, f"{time_minute}%"))
-                    if not c.fetchone():
-                        c.execute("INSERT INTO attendance (name, date, time) VALUES (?, ?, ?)",
-                                  (name, date, time))
-                        conn.commit()
-                    conn.close()
-
-        if name != "Unknown":
-            results.append(name)
-
-    return jsonify({"status": "success", "recognized": results})
+@app.route("/attendance/tiles", methods=["POST"])
+@admission_controlled
+def attendance_tiles():
+    global attendance_active
+    if not attendance_active:
+        return jsonify({"status": "error", "message": "Attendance not started"}), 403
+
+    data = request.json or {}
+    tiles = data.get("tiles")
+
+    # Clients without a local detector can still send the whole frame
+    if not tiles:
+        if data.get("image"):
+            return frame_attendance(data)
+        return jsonify({"status": "error", "message": "No tiles provided"}), 400
+
+    if len(tiles) > MAX_TILES:
+        return jsonify({"status": "error", "message": f"At most {MAX_TILES} tiles per request"}), 413
+
+    encodings = []
+    boxes = []
+    for tile in tiles:
+        try:
+            if len(tile["image"]) > MAX_TILE_B64:
+                raise ValueError("tile too large")
+            face = base64_to_image(tile["image"], cv2.IMREAD_GRAYSCALE)
+            encodings.append(get_face_encoding(face, (0, 0, face.shape[1], face.shape[0])))
+        except Exception as e:
+            return jsonify({"status": "error", "message": f"Tile error: {str(e)}"}), 400
+        boxes.append(tile.get("box"))
+
+    names = recognize(encodings, client_key())
+    return jsonify({
+        "status": "success",
+        "recognized": [n for n in names if n != "Unknown"],
+        "faces": [{"box": box, "name": n} for box, n in zip(boxes, names)]
+    })
+
+@app.route("/api/recognition/status", methods=["GET"])
+def recognition_status():
+    active = recognition_limiter.active()
+    return jsonify({
+        "status": "success",
+        "attendance_active": attendance_active,
+        "active_clients": active,
+        "suggested_interval": recognition_gate.suggested_interval(active),
+        "shards": sharded_gallery.status() if sharded_gallery is not None else None,
+        "crop_cache": crop_cache.stats(),
+        **recognition_gate.status()
+    })
 
 @app.route("/api/login", methods=["POST"])
 def api_login():
@@ -297,12 +579,12 @@ def api_login():
             return jsonify({'status': 'error', 'message': 'Invalid admin credentials'}), 401
         
         elif role == "student":
-            conn = sqlite3.connect(DB_FILE)
+            conn = history_db()
             c = conn.cursor()
             c.execute("SELECT 1 FROM students WHERE lower(name)=lower(?)", (name,))
             exists = c.fetchone()
             
-            c.execute("SELECT 1 FROM attendance WHERE lower(name)=lower(?) LIMIT 1", (name,))
+            c.execute("SELECT 1 FROM attendance_all WHERE lower(name)=lower(?) LIMIT 1", (name,))
             attendance_exists = c.fetchone()
             conn.close()
             
@@ -314,13 +596,12 @@ def api_login():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
-@app.route("/api/google_login", methods=["POST"])
-def api_google_login():
+def google_login(data):
+    """(payload, status) for a Google Identity credential; shared with the ASGI mode."""
     try:
-        data = request.json
         credential = data.get("credential")
         if not credential:
-            return jsonify({'status': 'error', 'message': 'No credential provided'}), 400
+            return {'status': 'error', 'message': 'No credential provided'}, 400
             
         # Decode JWT without verifying Google's signature (for simplicity in our backend, 
         # since Google Identity Services already verified it on the frontend)
@@ -328,13 +609,13 @@ def api_google_login():
         
         email = decoded.get("email", "")
         if not email.endswith("@psnacet.edu.in") and email != "srirams23cs@psnacet.edu.in":
-            return jsonify({'status': 'error', 'message': 'Access restricted to PSNACET educational accounts only.'}), 403
+            return {'status': 'error', 'message': 'Access restricted to PSNACET educational accounts only.'}, 403
             
         # Give them an institutional session token
         name = decoded.get("name", email.split("@")[0])
         token = jwt.encode({'user': name, 'role': 'institution'}, app.config['SECRET_KEY'], algorithm="HS256")
         
-        return jsonify({
+        return {
             'status': 'success', 
             'token': token, 
             'role': 'institution',
@@ -343,50 +624,98 @@ def api_google_login():
                 'email': email,
                 'picture': decoded.get("picture", "")
             }
-        })
+        }, 200
     except Exception as e:
-        return jsonify({'status': 'error', 'message': f'Google auth failed: {str(e)}'}), 400
+        return {'status': 'error', 'message': f'Google auth failed: {str(e)}'}, 400
+
+@app.route("/api/google_login", methods=["POST"])
+def api_google_login():
+    payload, status = google_login(request.get_json(silent=True) or {})
+    return jsonify(payload), status
+
+# Query helpers take an open history_db() connection so the ASGI mode can run
+# them on its own long-lived connections.
+def report_rows(conn):
+    return conn.execute("SELECT name, date, time FROM attendance_all ORDER BY id DESC").fetchall()
+
+def month_rows(conn, ym):
+    # ym expected format YYYY-MM
+    return conn.execute(f"SELECT name, date, time FROM {table_for_month(conn, ym)} "
+                        "WHERE date BETWEEN ? AND ? ORDER BY date DESC, time DESC", month_range(ym)).fetchall()
+
+def build_grid(conn, ym):
+    table = table_for_month(conn, ym) if ym else "attendance_all"
+    return grid_cache.put(ym, attendance_grid(conn.cursor(), ym, table))
 
 @app.route("/report", methods=["GET"])
 def report():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT name, date, time FROM attendance ORDER BY id DESC")
-    rows = c.fetchall()
-    conn.close()
-    return jsonify(rows)
+    conn = history_db()
+    try:
+        return jsonify(report_rows(conn))
+    finally:
+        conn.close()
 
 @app.route("/report/months", methods=["GET"])
 def report_months():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT substr(date, 1, 7) AS ym FROM attendance ORDER BY ym DESC")
-    months = [r[0] for r in c.fetchall()]
+    conn = history_db()
+    months = all_months(conn)
     conn.close()
     return jsonify(months)
 
 @app.route("/report/month/<ym>", methods=["GET"])
 def report_month(ym):
-    # ym expected format YYYY-MM
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT name, date, time FROM attendance WHERE substr(date,1,7)=? ORDER BY date DESC, time DESC", (ym,))
-    rows = c.fetchall()
-    conn.close()
-    return jsonify(rows)
+    conn = history_db()
+    try:
+        return jsonify(month_rows(conn, ym))
+    finally:
+        conn.close()
+
+def grid_reply(entry, if_none_match):
+    """(status, body, headers) for a grid entry; 304 when If-None-Match has its ETag.
+
+    Shared by the Flask route and the ASGI one so both answer alike.
+    """
+    body, etag = entry
+    # Closed months only change on admin edits; always revalidate via the ETag
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if parse_etags(if_none_match).contains_weak(etag):
+        return 304, b"", headers
+    return 200, body, headers
+
+def grid_response(ym):
+    entry = grid_cache.get(ym)
+    if entry is None:
+        conn = history_db()
+        try:
+            entry = build_grid(conn, ym)
+        finally:
+            conn.close()
+    status, body, headers = grid_reply(entry, request.headers.get("If-None-Match"))
+    return Response(body, status=status, mimetype="application/json", headers=headers)
+
+@app.route("/report/grid", methods=["GET"])
+def report_grid():
+    return grid_response(None)
+
+@app.route("/report/month/<ym>/grid", methods=["GET"])
+def report_month_grid(ym):
+    if not re.fullmatch(r"\d{4}-\d{2}", ym):
+        return jsonify({"status": "error", "message": "Month must be YYYY-MM"}), 400
+    return grid_response(ym)
 
 @app.route("/students", methods=["GET"])
 def students_list():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT name, details FROM students ORDER BY name")
-    rows = c.fetchall()
-    conn.close()
-    return jsonify([{"name": r[0], "details": r[1]} for r in rows])
+    return jsonify([{"name": r[1], "details": r[2]} for r in roster.load()])
 
 @app.route("/student/<name>", methods=["GET"])
 def student_profile(name):
-    conn = sqlite3.connect(DB_FILE)
+    conn = history_db()
+    try:
+        return jsonify(student_profile_data(conn, name))
+    finally:
+        conn.close()
+
+def student_profile_data(conn, name):
     c = conn.cursor()
 
     # Resolve student name case-insensitively from students table first.
@@ -397,7 +726,7 @@ def student_profile(name):
         resolved_name, details = student_row[0], student_row[1] or ""
     else:
         # Fallback for existing attendance records without student row, or brand new search
-        c.execute("SELECT name FROM attendance WHERE lower(name)=lower(?) LIMIT 1", (name,))
+        c.execute("SELECT name FROM attendance_all WHERE lower(name)=lower(?) LIMIT 1", (name,))
         attendance_row = c.fetchone()
         if not attendance_row:
             # If not in DB, allow them to view 0% profile rather than erroring 404
@@ -405,31 +734,20 @@ def student_profile(name):
         else:
             resolved_name, details = attendance_row[0], ""
 
-    # compute attendance percentage based on distinct class dates
-    c.execute("SELECT DISTINCT date FROM attendance ORDER BY date")
-    class_dates = [r[0] for r in c.fetchall()]
-    total = len(class_dates)
-    c.execute("SELECT COUNT(DISTINCT date) FROM attendance WHERE name=?", (resolved_name,))
-    present = c.fetchone()[0]
-    c.execute("SELECT date, time FROM attendance WHERE name=? ORDER BY date DESC, time DESC", (resolved_name,))
+    c.execute("SELECT date, time FROM attendance_all WHERE name=? ORDER BY date DESC, time DESC", (resolved_name,))
     per_date = {}
     for d, t in c.fetchall():
         per_date.setdefault(d, []).append(t)
     records = [{"date": d, "times": times} for d, times in per_date.items()]
 
-    # compute leave dates as dates in class_dates where student has no record
-    leave_dates = []
-    for d in class_dates:
-        c.execute("SELECT 1 FROM attendance WHERE name=? AND date=?", (resolved_name, d))
-        if not c.fetchone():
-            leave_dates.append(d)
-    conn.close()
+    # percentage and leave dates are over distinct class dates, straight from the cube
+    present, total, leave_dates = attendance_cube.student_summary(resolved_name)
 
     percentage = 0.0
     if total > 0:
         percentage = round((present / total) * 100.0, 2)
 
-    return jsonify({
+    return {
         "name": resolved_name,
         "details": details,
         "present": present,
@@ -438,7 +756,7 @@ def student_profile(name):
         "leave_dates": leave_dates,
         "low_attendance": percentage < 75.0,
         "records": records
-    })
+    }
 
 @app.route("/student/update", methods=["POST"])
 def student_update():
@@ -454,25 +772,33 @@ def student_update():
     if not name:
         return jsonify({"status": "error", "message": "Missing name"}), 400
 
+    renamed = bool(new_name) and new_name != name
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     try:
-        if new_name:
+        if renamed:
             c.execute("SELECT 1 FROM students WHERE name=?", (new_name,))
-            if c.fetchone() and new_name != name:
+            if c.fetchone():
                 return jsonify({"status": "error", "message": "New name already exists"}), 409
-            c.execute("UPDATE students SET name=? WHERE name=?", (new_name, name))
-            c.execute("UPDATE attendance SET name=? WHERE name=?", (new_name, name))
-            # update encodings mapping if present
-            if name in known_encodings:
-                known_encodings[new_name] = known_encodings.pop(name)
-                save_encodings()
         if details is not None:
-            c.execute("UPDATE students SET details=? WHERE name=?", (details, new_name or name))
+            c.execute("UPDATE students SET details=? WHERE name=?", (details, name))
         conn.commit()
+        if renamed:
+            # The profile and face gallery move now, so the new name is
+            # registered as soon as this returns; only history waits on the job
+            rename_profile(conn, update_gallery, name, new_name)
     finally:
         conn.close()
 
+    if renamed:
+        attendance_changed()
+        job = job_manager.submit("rename_history", name=name, new_name=new_name)
+        return jsonify({"status": "success", "message": "Student renamed, attendance history is being moved",
+                        "job_id": job.id})
+
+    if details is not None:
+        # /students is served from the roster cache
+        roster.invalidate()
     return jsonify({"status": "success", "message": "Student updated"})
 
 @app.route("/student/attendance/update", methods=["POST"])
@@ -495,49 +821,189 @@ def student_attendance_update():
     target_date = new_date or date
     target_time = new_time or time or datetime.now().strftime("%H:%M:%S")
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = history_db()
     c = conn.cursor()
     try:
         c.execute("SELECT 1 FROM students WHERE lower(name)=lower(?)", (name,))
         student_exists = c.fetchone() is not None
         
-        c.execute("SELECT 1 FROM attendance WHERE lower(name)=lower(?) LIMIT 1", (name,))
+        c.execute("SELECT 1 FROM attendance_all WHERE lower(name)=lower(?) LIMIT 1", (name,))
         attendance_exists = c.fetchone() is not None
         
         if not (student_exists or attendance_exists):
             return jsonify({"status": "error", "message": "Student not found"}), 404
 
-        c.execute("SELECT id FROM attendance WHERE name=? AND date=?", (name, date))
+        # Edits to closed months go to the archive partition holding them.
+        # New rows are always inserted live and then archived, so every id
+        # comes from the live table's AUTOINCREMENT and never clashes.
+        src = table_for_date(conn, date)
+        dst = table_for_date(conn, target_date)
+
+        c.execute(f"SELECT id FROM {src} WHERE name=? AND date=?", (name, date))
         existing = c.fetchone()
 
         if present is False:
-            c.execute("DELETE FROM attendance WHERE name=? AND date=?", (name, date))
+            c.execute(f"DELETE FROM {src} WHERE name=? AND date=?", (name, date))
             conn.commit()
+            attendance_changed(date[:7])
             return jsonify({"status": "success", "message": "Attendance removed"})
 
         if existing:
-            c.execute("SELECT id FROM attendance WHERE name=? AND date=?", (name, target_date))
+            c.execute(f"SELECT id FROM {dst} WHERE name=? AND date=?", (name, target_date))
             target_existing = c.fetchone()
             if target_existing and target_date != date:
-                c.execute("UPDATE attendance SET time=? WHERE name=? AND date=?", (target_time, name, target_date))
-                c.execute("DELETE FROM attendance WHERE name=? AND date=?", (name, date))
+                c.execute(f"UPDATE {dst} SET time=? WHERE name=? AND date=?", (target_time, name, target_date))
+                c.execute(f"DELETE FROM {src} WHERE name=? AND date=?", (name, date))
+            elif src != dst:
+                c.execute(f"DELETE FROM {src} WHERE name=? AND date=?", (name, date))
+                c.execute("INSERT INTO main.attendance (name, date, time) VALUES (?, ?, ?)",
+                          (name, target_date, target_time))
             else:
-                c.execute("UPDATE attendance SET date=?, time=? WHERE name=? AND date=?",
+                c.execute(f"UPDATE {src} SET date=?, time=? WHERE name=? AND date=?",
                           (target_date, target_time, name, date))
         else:
-            c.execute("SELECT id FROM attendance WHERE name=? AND date=?", (name, target_date))
+            c.execute(f"SELECT id FROM {dst} WHERE name=? AND date=?", (name, target_date))
             target_existing = c.fetchone()
             if target_existing:
-                c.execute("UPDATE attendance SET time=? WHERE name=? AND date=?", (target_time, name, target_date))
+                c.execute(f"UPDATE {dst} SET time=? WHERE name=? AND date=?", (target_time, name, target_date))
             else:
-                c.execute("INSERT INTO attendance (name, date, time) VALUES (?, ?, ?)",
+                c.execute("INSERT INTO main.attendance (name, date, time) VALUES (?, ?, ?)",
                           (name, target_date, target_time))
         conn.commit()
+        if dst != "main.attendance":
+            archive_month(conn, target_date[:7])
     finally:
         conn.close()
+    attendance_changed(date[:7], target_date[:7])
 
     return jsonify({"status": "success", "message": "Attendance updated"})
 
+@app.route("/api/jobs", methods=["GET", "POST"])
+@token_required
+def jobs_list(current_user):
+    if current_user.get("role") != "admin":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    if request.method == "GET":
+        return jsonify({"status": "success", "jobs": job_manager.list()})
+
+    data = request.json or {}
+    try:
+        job = job_manager.submit(data.get("type"), **{k: v for k, v in data.items() if k != "type"})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "job": job.to_dict()}), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@token_required
+def job_status(current_user, job_id):
+    if current_user.get("role") != "admin":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+# ----------------- Diagnostics -----------------
+profiler = SamplingProfiler()
+allocation_tracer = AllocationTracer(max_seconds=float(os.environ.get('TRACEMALLOC_MAX_SECONDS', '300')))
+
+def memory_breakdown():
+    gallery = list(known_encodings.values())
+    grids = list(grid_cache.entries.values())
+    answers = list(chat_cache.entries.values())
+    return {
+        "process": process_memory(),
+        "gallery": {"students": len(gallery), "bytes": int(sum(getattr(e, "nbytes", 0) for e in gallery)),
+                    "shards": sharded_gallery.status() if sharded_gallery is not None else None},
+        "attendance_cube": {"students": len(attendance_cube.students), "dates": len(attendance_cube.dates),
+                            "bytes": attendance_cube.nbytes()},
+        "grid_cache": {"entries": len(grids), "bytes": sum(len(body) for body, _ in grids)},
+        "chat_cache": {"entries": len(answers), "bytes": sum(len(a) for _, a in answers)},
+        "crop_cache": crop_cache.stats(),
+        "token_cache": token_verifier.stats(),
+        "roster": {"students": len(roster.rows or ())},
+        "static_assets": {"files": len(static_manifest.assets),
+                          "bytes": sum(len(a.body) + sum(len(v) for v in a.variants.values())
+                                       for a in static_manifest.assets.values())},
+        "sqlite": sqlite_memory(),
+    }
+
+@app.route("/api/admin/diagnostics/memory", methods=["GET"])
+@token_required
+def diagnostics_memory(current_user):
+    if current_user.get("role") != "admin":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    return jsonify({"status": "success", "memory": memory_breakdown(), "tracemalloc": allocation_tracer.status()})
+
+def listing_limit(default=20):
+    """?limit= as a positive int, or None when it is anything else."""
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        return None
+    return limit if limit > 0 else None
+
+@app.route("/api/admin/diagnostics/profile", methods=["GET", "POST"])
+@token_required
+def diagnostics_profile(current_user):
+    if current_user.get("role") != "admin":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    if request.method == "POST":
+        # Sampling runs on its own thread; poll GET for the result
+        data = request.get_json(silent=True) or {}
+        try:
+            profile = profiler.start(data.get("seconds", 10), data.get("interval", 0.01))
+        except RuntimeError as e:
+            return jsonify({"status": "error", "message": str(e)}), 409
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "seconds and interval must be numbers"}), 400
+        return jsonify({"status": "success", "profile": profile}), 202
+
+    if request.args.get("format") == "folded":
+        if profiler.status != "done":
+            return jsonify({"status": "error", "message": f"Profile is {profiler.status}"}), 409
+        return Response(profiler.folded(), mimetype="text/plain")
+    limit = listing_limit()
+    if limit is None:
+        return jsonify({"status": "error", "message": "limit must be a positive integer"}), 400
+    profile = profiler.to_dict()
+    if profiler.status == "done":
+        profile["top_functions"] = profiler.top_functions(limit)
+    return jsonify({"status": "success", "profile": profile})
+
+@app.route("/api/admin/diagnostics/tracemalloc", methods=["GET", "POST"])
+@token_required
+def diagnostics_tracemalloc(current_user):
+    if current_user.get("role") != "admin":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        action = data.get("action")
+        if action == "start":
+            frames = data.get("frames", 10)
+            if isinstance(frames, bool) or not isinstance(frames, int) or frames < 1:
+                return jsonify({"status": "error", "message": "frames must be a positive integer"}), 400
+            return jsonify({"status": "success", "tracemalloc": allocation_tracer.start(frames)})
+        if action == "stop":
+            return jsonify({"status": "success", "tracemalloc": allocation_tracer.stop()})
+        return jsonify({"status": "error", "message": "action must be start or stop"}), 400
+
+    limit = listing_limit()
+    if limit is None:
+        return jsonify({"status": "error", "message": "limit must be a positive integer"}), 400
+    group = request.args.get("group", "lineno")
+    if group not in ("lineno", "traceback"):
+        return jsonify({"status": "error", "message": "group must be lineno or traceback"}), 400
+    return jsonify({
+        "status": "success",
+        "tracemalloc": allocation_tracer.status(),
+        "top": allocation_tracer.top(limit, group),
+    })
+
 @app.route("/api/chat/admin", methods=["POST"])
 @token_required
 def chat_admin(current_user):
@@ -545,41 +1011,16 @@ def chat_admin(current_user):
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
     
     query = request.json.get("query", "").lower()
-    response = "I'm sorry, I didn't understand the query. Try asking 'who is absent in period 1' or 'how many present today'."
-    
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
     now = datetime.now()
     today = now.strftime("%Y-%m-%d")
-    
-    # "Who is absent in period 3?"
-    absent_match = re.search(r"absent.*period\s*(\d)", query) or re.search(r"period\s*(\d).*absent", query)
-    if absent_match:
-        period = int(absent_match.group(1))
-        hour_target = 7 + period
-        time_like = f"{hour_target:02d}:%"
-        c.execute("SELECT name FROM attendance WHERE date=? AND time LIKE ?", (today, time_like))
-        present_students = [row[0].upper() for row in c.fetchall()]
-        
-        c.execute("SELECT name FROM students")
-        all_students = [row[0].upper() for row in c.fetchall()]
-        
-        absent = [s for s in all_students if s not in present_students]
-        response = f"Students absent in Period {period} today: {', '.join(absent) if absent else 'None, all present!'}"
-
-    # "How many students were present today?"
-    elif any(word in query for word in ["how many", "total", "count"]) and "present" in query:
-        c.execute("SELECT COUNT(DISTINCT name) FROM attendance WHERE date=?", (today,))
-        count = c.fetchone()[0]
-        response = f"{count} students were marked present today."
-
-    now_time = now.strftime("%H:%M:%S")
-    c.execute("INSERT INTO chat_logs (role, query, response, date, time) VALUES (?, ?, ?, ?, ?)", 
-              ("admin", query, response, today, now_time))
-    conn.commit()
-    conn.close()
-    
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        response = answer_admin(conn.cursor(), chat_cache, query, today)
+    finally:
+        conn.close()
+
+    chat_log_writer.log("admin", query, response, today, now.strftime("%H:%M:%S"))
     return jsonify({"status": "success", "response": response})
 
 @app.route("/api/chat/student", methods=["POST"])
@@ -588,48 +1029,18 @@ def chat_student(current_user):
     if current_user.get("role") != "student":
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
     
-    name = current_user.get("user")
+    name = g.user.name
     query = request.json.get("query", "").lower()
-    response = "I'm sorry, I didn't understand. If you have an issue, you can say 'raise attendance complaint' or 'what is my attendance'."
-    
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     now = datetime.now()
     today = now.strftime("%Y-%m-%d")
-    
-    if any(word in query for word in ["percentage", "attendance", "how much", "my record"]):
-        c.execute("SELECT DISTINCT date FROM attendance ORDER BY date")
-        class_dates = [r[0] for r in c.fetchall()]
-        total = len(class_dates)
-        c.execute("SELECT COUNT(DISTINCT date) FROM attendance WHERE name=?", (name,))
-        present = c.fetchone()[0]
-        pct = round((present/total)*100, 2) if total > 0 else 0
-        response = f"Your current attendance percentage is {pct}%. You have attended {present} out of {total} days."
-        
-    elif any(word in query for word in ["complaint", "issue", "problem", "report"]):
-        c.execute("INSERT INTO complaints (student_name, complaint, date) VALUES (?, ?, ?)", (name, query, today))
-        conn.commit()
-        response = "Your complaint has been logged and will be forwarded to the admin."
-        
-    elif "today" in query and any(word in query for word in ["present", "here"]):
-        c.execute("SELECT COUNT(*) FROM attendance WHERE name=? AND date=?", (name, today))
-        count = c.fetchone()[0]
-        if count > 0:
-             response = f"Yes, you were marked present for {count} period(s) today."
-        else:
-             response = "No, you have not been marked present today."
-             
-    elif "today" in query and "period" in query:
-        c.execute("SELECT COUNT(*) FROM attendance WHERE name=? AND date=?", (name, today))
-        count = c.fetchone()[0]
-        response = f"You were marked present for {count} period(s) today."
-        
-    now_time = now.strftime("%H:%M:%S")
-    c.execute("INSERT INTO chat_logs (role, query, response, date, time) VALUES (?, ?, ?, ?, ?)", 
-              (name, query, response, today, now_time))
-    conn.commit()
-    conn.close()
-    
+
+    conn = history_db()
+    try:
+        response = answer_student(conn.cursor(), chat_cache, name, query, today)
+    finally:
+        conn.close()
+
+    chat_log_writer.log(name, query, response, today, now.strftime("%H:%M:%S"))
     return jsonify({"status": "success", "response": response})
 
 @app.route("/api/analytics/intelligence", methods=["GET"])
@@ -638,82 +1049,29 @@ def analytics_intelligence(current_user):
     if current_user.get("role") != "admin":
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
         
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    now = datetime.now()
-    today = now.strftime("%Y-%m-%d")
-    
-    c.execute("SELECT COUNT(DISTINCT name) FROM attendance WHERE date=?", (today,))
-    occupancy = c.fetchone()[0]
-    
-    c.execute("SELECT substr(time, 1, 2) as hour, COUNT(*) as count FROM attendance GROUP BY hour ORDER BY count ASC LIMIT 1")
-    skipped_row = c.fetchone()
-    skipped_period = f"Hour {skipped_row[0]}" if skipped_row else "N/A"
-    
-    c.execute("SELECT DISTINCT date FROM attendance")
-    total_days = len(c.fetchall())
-    
-    c.execute("SELECT name, COUNT(DISTINCT date) as days_present FROM attendance GROUP BY name")
-    student_stats = c.fetchall()
-    frequent_absentees = []
-    for row in student_stats:
-        s_name, s_present = row
-        pct = (s_present / total_days) * 100 if total_days > 0 else 0
-        if pct < 75:
-            frequent_absentees.append({"name": s_name, "percentage": round(pct, 2)})
-            
-    conn.close()
-    
-    return jsonify({
+    return jsonify(intelligence_data())
+
+def intelligence_data():
+    today = datetime.now().strftime("%Y-%m-%d")
+    occupancy = attendance_cube.present_on(today)
+    skipped = attendance_cube.most_skipped_period()
+    skipped_period = f"Period {skipped}" if skipped else "N/A"
+    frequent_absentees = attendance_cube.below(75.0)
+
+    return {
         "status": "success",
         "occupancy": occupancy,
         "most_skipped_period": skipped_period,
         "frequent_absentees": frequent_absentees
-    })
+    }
 
 @app.route("/api/analytics/heatmap", methods=["GET"])
 @token_required
 def analytics_heatmap(current_user):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    name = current_user.get("user")
-    role = current_user.get("role")
-    
-    if role == "admin":
-        c.execute("SELECT date, time FROM attendance")
-    else:
-        c.execute("SELECT date, time FROM attendance WHERE name=?", (name,))
-        
-    rows = c.fetchall()
-    conn.close()
-    
-    heatmap_data = {day: {p: 0 for p in range(1, 9)} for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]}
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    
-    for r in rows:
-        date_str, time_str = r[0], r[1]
-        try:
-            d = datetime.strptime(date_str, "%Y-%m-%d")
-            day_name = day_names[d.weekday()]
-            if day_name == "Sunday": continue
-            
-            hour = int(time_str.split(':')[0])
-            if hour == 8: p = 1
-            elif hour == 9: p = 2
-            elif hour == 10: p = 3
-            elif hour == 11: p = 4
-            elif hour == 12: p = 5
-            elif hour == 13: p = 6
-            elif hour == 14: p = 7
-            elif hour == 15: p = 8
-            else: p = (hour % 8) + 1
-            
-            if 1 <= p <= 8:
-                heatmap_data[day_name][p] += 1
-        except:
-            pass
-            
+    # Admins see the whole institution, everyone else only their own marks
+    name = None if g.user.role == "admin" else g.user.name
+    heatmap_data = attendance_cube.weekday_heatmap(name)
+
     return jsonify({"status": "success", "heatmap": heatmap_data})
 
 @app.route("/students", methods=["GET"])
@@ -732,15 +1090,27 @@ def catch_all(path):
     if path in ["favicon.ico", "robots.txt", ".well-known/apple-app-site-association"]:
          return "", 404
 
-    # Check if the requested path is a file in the frontend directory
-    file_path = os.path.join(frontend_dir, path)
-    if os.path.isfile(file_path):
-        return app.send_static_file(path)
-    
+    # Serve frontend files from the startup manifest, no filesystem probe per request
+    asset = static_manifest.get(path)
+    if asset is not None:
+        return static_manifest.response(asset, request)
+
     # Otherwise, default to index.html for SPA support
     if path.startswith('api/') or path.startswith('static/'):
         return jsonify({"status": "error", "message": "Endpoint not found"}), 404
-    return app.send_static_file("index.html")
+    return static_manifest.response(static_manifest.get("index.html"), request)
+
+def cors_resources():
+    # flask_cors matches on the path alone, so list every route except the
+    # frontend ones; pages, assets and the SPA fallback get no CORS headers.
+    return [re.compile("^" + re.sub(r"<[^>]+>", "[^/]+", rule.rule) + "$")
+            for rule in app.url_map.iter_rules() if rule.endpoint not in STATIC_ENDPOINTS]
+
+# Registered after every route so the resource list is complete
+CORS(app, resources=cors_resources(), origins="*", send_wildcard=True,
+     allow_headers=["Content-Type", "Authorization", "X-Client-Id"],
+     expose_headers=["Retry-After", "X-Queue-Depth", "X-Suggested-Interval"],
+     methods=["GET", "PUT", "POST", "DELETE", "OPTIONS"])
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+from datetime import datetime
+
+from reports import month_range
+
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.attendance (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        date TEXT,
+        time TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_name_date ON attendance (name, date)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_date_time ON attendance (date, time)",
+    """
+    CREATE TABLE IF NOT EXISTS archive.archived_months (
+        month TEXT PRIMARY KEY,
+        rows INTEGER,
+        archived_at TEXT
+    )
+    """,
+]
+
+
+def connect(db_file, archive_file, timeout=5.0):
+    """Connection with closed months attached as ``archive``.
+
+    ``attendance`` stays the live table; the temp view ``attendance_all``
+    spans live and archived rows for queries over the whole history.
+    """
+    os.makedirs(os.path.dirname(archive_file) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_file, timeout=timeout)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_file,))
+    for sql in ARCHIVE_SCHEMA:
+        conn.execute(sql)
+    conn.execute("""
+        CREATE TEMP VIEW IF NOT EXISTS attendance_all AS
+        SELECT id, name, date, time FROM main.attendance
+        UNION ALL
+        SELECT id, name, date, time FROM archive.attendance
+    """)
+    return conn
+
+
+def archived_months(conn):
+    return {r[0] for r in conn.execute("SELECT month FROM archive.archived_months")}
+
+
+def table_for_month(conn, ym):
+    return "archive.attendance" if ym in archived_months(conn) else "main.attendance"
+
+
+def table_for_date(conn, date):
+    return table_for_month(conn, (date or "")[:7])
+
+
+def attendance_tables(conn):
+    # Every physical attendance table on this connection, live first
+    attached = {r[1] for r in conn.execute("PRAGMA database_list")}
+    return ["main.attendance", "archive.attendance"] if "archive" in attached else ["main.attendance"]
+
+
+def all_months(conn):
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT substr(date, 1, 7) FROM main.attendance")
+    months = {r[0] for r in c.fetchall() if r[0]}
+    months.update(archived_months(conn))
+    return sorted(months, reverse=True)
+
+
+def months_to_archive(conn, keep_months, today=None):
+    today = today or datetime.now()
+    # First month that stays live: the current month and keep_months - 1 before it
+    index = today.year * 12 + today.month - 1 - max(1, keep_months) + 1
+    cutoff = f"{index // 12:04d}-{index % 12 + 1:02d}"
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT substr(date, 1, 7) AS ym FROM main.attendance WHERE date < ? ORDER BY ym", (cutoff,))
+    return [r[0] for r in c.fetchall() if r[0]]
+
+
+def archive_month(conn, ym):
+    """Move one closed month out of the live table in a single transaction.
+
+    Rows keep their live ids. Those come from the live table's AUTOINCREMENT
+    and are never reused, so a plain INSERT can't collide with, or silently
+    replace, an archived row.
+    """
+    lo, hi = month_range(ym)
+    with conn:
+        conn.execute("INSERT INTO archive.attendance (id, name, date, time) "
+                     "SELECT id, name, date, time FROM main.attendance WHERE date BETWEEN ? AND ?", (lo, hi))
+        moved = conn.execute("DELETE FROM main.attendance WHERE date BETWEEN ? AND ?", (lo, hi)).rowcount
+        conn.execute("""
+            INSERT INTO archive.archived_months (month, rows, archived_at) VALUES (?, ?, ?)
+            ON CONFLICT(month) DO UPDATE SET rows = rows + excluded.rows, archived_at = excluded.archived_at
+        """, (ym, moved, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    return moved
@@ -0,0 +1,216 @@
+"""Async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000      (from backend/)
+    python asgi.py
+
+Reports, students, analytics, chat and Google login run as coroutines on
+the event loop with SQLite behind AsyncDB, so hundreds of idle or slow
+dashboard connections cost no threads. Camera frames go to the Flask app
+on their own thread pool, sized to the recognition admission gate, and
+never queue behind dashboard traffic. Every other route is the unchanged
+Flask app on a second pool.
+"""
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, attendance_cube, build_grid, chat_cache, chat_log_writer, cors_resources, google_login,
+    grid_cache, grid_reply, history_db, intelligence_data, month_rows, recognition_gate, report_rows, roster,
+    student_profile_data, token_verifier,
+)
+from archive import all_months
+from async_db import AsyncDB
+from auth import UserContext
+from chatbot import answer_admin, answer_student
+
+db = AsyncDB(history_db, workers=int(os.environ.get('ASYNC_DB_WORKERS', '4')))
+
+# Recognition gets threads for every request the gate can admit or queue,
+# plus a couple to turn the rest away quickly.
+recognition_app = WSGIMiddleware(flask_app, workers=recognition_gate.max_in_flight + recognition_gate.max_waiting + 2)
+wsgi_app = WSGIMiddleware(flask_app, workers=int(os.environ.get('WSGI_WORKERS', '8')))
+
+
+class ApiCORSMiddleware:
+    """CORSMiddleware on the API paths only.
+
+    The paths are Flask's cors_resources(), so the frontend pages and assets
+    behind the WSGI mount get no CORS headers here either.
+    """
+
+    def __init__(self, app, resources, **options):
+        self.app = app
+        self.cors = CORSMiddleware(app, **options)
+        self.resources = resources
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and any(r.match(scope["path"]) for r in self.resources):
+            await self.cors(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def error(message, status):
+    return JSONResponse({"status": "error", "message": message}, status_code=status)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+def authenticate(request):
+    """(claims, None) for a valid bearer token, else (None, error response)."""
+    token = request.headers.get("Authorization")
+    if not token:
+        return None, error("Token is missing", 401)
+    try:
+        token = token.split(" ")[1] if " " in token else token
+        return token_verifier.verify(token), None
+    except Exception:
+        return None, error("Token is invalid", 401)
+
+
+async def report(request):
+    return JSONResponse(await db.run(report_rows))
+
+
+async def report_months(request):
+    return JSONResponse(await db.run(all_months))
+
+
+async def report_month(request):
+    return JSONResponse(await db.run(month_rows, request.path_params["ym"]))
+
+
+async def grid(request):
+    ym = request.path_params.get("ym")
+    if ym is not None and not re.fullmatch(r"\d{4}-\d{2}", ym):
+        return error("Month must be YYYY-MM", 400)
+    entry = grid_cache.get(ym)
+    if entry is None:
+        entry = await db.run(build_grid, ym)
+    status, body, headers = grid_reply(entry, request.headers.get("If-None-Match"))
+    return Response(body, status_code=status, media_type="application/json", headers=headers)
+
+
+async def students(request):
+    rows = await db.call(roster.load)
+    return JSONResponse([{"name": r[1], "details": r[2]} for r in rows])
+
+
+async def student_profile(request):
+    return JSONResponse(await db.run(student_profile_data, request.path_params["name"]))
+
+
+async def analytics_intelligence(request):
+    claims, denied = authenticate(request)
+    if denied:
+        return denied
+    if claims.get("role") != "admin":
+        return error("Unauthorized", 403)
+    # The cube may need a rebuild from SQL, so keep it off the event loop
+    return JSONResponse(await db.call(intelligence_data))
+
+
+async def analytics_heatmap(request):
+    claims, denied = authenticate(request)
+    if denied:
+        return denied
+    user = UserContext(claims, roster)
+    name = None if user.role == "admin" else await db.call(lambda: user.name)
+    heatmap_data = await db.call(attendance_cube.weekday_heatmap, name)
+    return JSONResponse({"status": "success", "heatmap": heatmap_data})
+
+
+async def chat_admin(request):
+    claims, denied = authenticate(request)
+    if denied:
+        return denied
+    if claims.get("role") != "admin":
+        return error("Unauthorized", 403)
+
+    query = (await read_json(request)).get("query", "").lower()
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    response = await db.run(lambda conn: answer_admin(conn.cursor(), chat_cache, query, today))
+
+    chat_log_writer.log("admin", query, response, today, now.strftime("%H:%M:%S"))
+    return JSONResponse({"status": "success", "response": response})
+
+
+async def chat_student(request):
+    claims, denied = authenticate(request)
+    if denied:
+        return denied
+    if claims.get("role") != "student":
+        return error("Unauthorized", 403)
+
+    user = UserContext(claims, roster)
+    name = await db.call(lambda: user.name)
+    query = (await read_json(request)).get("query", "").lower()
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    response = await db.run(lambda conn: answer_student(conn.cursor(), chat_cache, name, query, today))
+
+    chat_log_writer.log(name, query, response, today, now.strftime("%H:%M:%S"))
+    return JSONResponse({"status": "success", "response": response})
+
+
+async def api_google_login(request):
+    payload, status = google_login(await read_json(request))
+    return JSONResponse(payload, status_code=status)
+
+
+async def server_error(request, exc):
+    return error(str(exc), 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    db.close()
+
+
+routes = [
+    Route("/report", report, methods=["GET"]),
+    Route("/report/months", report_months, methods=["GET"]),
+    Route("/report/grid", grid, methods=["GET"]),
+    Route("/report/month/{ym}", report_month, methods=["GET"]),
+    Route("/report/month/{ym}/grid", grid, methods=["GET"]),
+    Route("/students", students, methods=["GET"]),
+    Route("/student/{name}", student_profile, methods=["GET"]),
+    Route("/api/analytics/intelligence", analytics_intelligence, methods=["GET"]),
+    Route("/api/analytics/heatmap", analytics_heatmap, methods=["GET"]),
+    Route("/api/chat/admin", chat_admin, methods=["POST"]),
+    Route("/api/chat/student", chat_student, methods=["POST"]),
+    Route("/api/google_login", api_google_login, methods=["POST"]),
+    Route("/attendance", recognition_app),
+    Route("/attendance/tiles", recognition_app),
+    Mount("/", app=wsgi_app),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(ApiCORSMiddleware, resources=cors_resources(), allow_origins=["*"],
+                           allow_methods=["GET", "PUT", "POST", "DELETE", "OPTIONS"],
+                           allow_headers=["Content-Type", "Authorization", "X-Client-Id"],
+                           expose_headers=["Retry-After", "X-Queue-Depth", "X-Suggested-Interval"])],
+    exception_handlers={Exception: server_error},
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "5000")))
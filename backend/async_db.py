@@ -0,0 +1,47 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDB:
+    """SQLite for coroutines.
+
+    sqlite3 calls block, so they run on a small dedicated thread pool and the
+    event loop only awaits the result. Each pool thread opens one connection
+    on first use and keeps it, so a dashboard poll costs no connect/ATTACH.
+    """
+
+    def __init__(self, connect, workers=4):
+        self.connect = connect
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-db")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+        return conn
+
+    def _run(self, fn, args):
+        conn = self._conn()
+        try:
+            return fn(conn, *args)
+        except Exception:
+            # Don't leave a half-done transaction on a connection we reuse
+            try:
+                conn.rollback()
+            except Exception:
+                conn.close()
+                self.local.conn = None
+            raise
+
+    async def run(self, fn, *args):
+        """await fn(conn, *args) on a pool thread's connection."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._run, fn, args)
+
+    async def call(self, fn, *args):
+        """await fn(*args) on the pool, for work that reads SQL through its own path."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
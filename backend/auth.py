@@ -0,0 +1,114 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+class TokenVerifier:
+    """jwt.decode with a bounded LRU of already-verified tokens.
+
+    Entries are keyed by a SHA-256 digest of the raw token, so the cache never
+    holds the tokens themselves, and live no longer than the token's own
+    ``exp`` claim or ``ttl`` seconds, whichever comes first.
+    """
+
+    def __init__(self, secret, max_entries=1024, ttl=300.0):
+        self.secret = secret
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token):
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self.entries[key]
+            self.misses += 1
+
+        # Raises on a bad signature or an expired token; failures are never cached
+        claims = jwt.decode(token, self.secret, algorithms=["HS256"])
+        expires = now + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires = min(expires, claims["exp"])
+
+        with self.lock:
+            self.entries[key] = (claims, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class Roster:
+    """The students table, loaded once and reused until the next roster write."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.rows = None
+        self.by_lower = {}
+
+    def load(self):
+        rows = self.rows
+        if rows is not None:
+            return rows
+        with self.lock:
+            if self.rows is None:
+                conn = sqlite3.connect(self.db_file)
+                try:
+                    rows = conn.execute("SELECT id, name, details FROM students ORDER BY name").fetchall()
+                finally:
+                    conn.close()
+                self.by_lower = {r[1].lower(): r for r in rows if r[1]}
+                self.rows = rows
+            return self.rows
+
+    def find(self, name):
+        self.load()
+        return self.by_lower.get((name or "").lower())
+
+    def invalidate(self):
+        with self.lock:
+            self.rows = None
+            self.by_lower = {}
+
+
+class UserContext:
+    """Who is making the request, resolved against the roster at most once."""
+
+    def __init__(self, claims, roster):
+        self.claims = claims
+        self.roster = roster
+        self.user = claims.get("user")
+        self.role = claims.get("role")
+        self._student = False
+
+    @property
+    def student(self):
+        if self._student is False:
+            self._student = self.roster.find(self.user) if self.role == "student" else None
+        return self._student
+
+    @property
+    def student_id(self):
+        return self.student[0] if self.student else None
+
+    @property
+    def name(self):
+        # Canonical spelling from the students table, else the name in the token
+        return self.student[1] if self.student else self.user
@@ -0,0 +1,83 @@
+"""Micro-benchmark of per-request auth overhead.
+
+Compares a full jwt.decode against a TokenVerifier cache hit, both on their
+own and through a minimal Flask route guarded the same way token_required
+guards the real ones.
+
+    python bench_auth.py [iterations]
+"""
+import sys
+import time
+from functools import wraps
+
+import jwt
+from flask import Flask, g, jsonify, request
+
+from auth import TokenVerifier, UserContext
+
+SECRET = "bench_secret_key_that_is_long_enough_for_hs256"
+
+
+class NoRoster:
+    def find(self, name):
+        return None
+
+
+def timed(label, fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<34} {per_call:9.2f} us/request")
+    return per_call
+
+
+def make_app(verify):
+    app = Flask(__name__)
+
+    def guarded(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            token = request.headers.get('Authorization', '').split(" ")[-1]
+            try:
+                current_user = verify(token)
+            except Exception:
+                return jsonify({'status': 'error', 'message': 'Token is invalid'}), 401
+            g.user = UserContext(current_user, NoRoster())
+            return f(current_user, *args, **kwargs)
+        return decorated
+
+    @app.route("/protected")
+    @guarded
+    def protected(current_user):
+        return jsonify({"status": "success", "role": g.user.role})
+
+    return app
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = jwt.encode({'user': 'bench', 'role': 'admin'}, SECRET, algorithm="HS256")
+    verifier = TokenVerifier(SECRET)
+
+    def decode(t):
+        return jwt.decode(t, SECRET, algorithms=["HS256"])
+
+    print(f"{iterations} iterations\n")
+    full = timed("jwt.decode (uncached)", lambda: decode(token), iterations)
+    hit = timed("TokenVerifier.verify (cache hit)", lambda: verifier.verify(token), iterations)
+    print(f"{'decode saved per request':<34} {full - hit:9.2f} us ({full / hit:.1f}x)\n")
+
+    headers = {"Authorization": f"Bearer {token}"}
+    uncached = make_app(decode).test_client()
+    cached = make_app(verifier.verify).test_client()
+    req_full = timed("Flask request, uncached auth", lambda: uncached.get("/protected", headers=headers), iterations // 10)
+    req_hit = timed("Flask request, cached auth", lambda: cached.get("/protected", headers=headers), iterations // 10)
+    print(f"{'auth share of request (uncached)':<34} {full / req_full * 100:8.1f} %")
+    print(f"{'auth share of request (cached)':<34} {hit / req_hit * 100:8.1f} %")
+    print(f"\ncache stats: {verifier.stats()}")
+
+
+if __name__ == "__main__":
+    main()
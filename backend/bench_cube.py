@@ -0,0 +1,113 @@
+"""Benchmark of AttendanceCube queries at institution scale.
+
+Builds a synthetic 5,000-student x 200-day x 8-period cube (about 85%
+attendance, with a few chronic absentees) and times each analytics answer.
+The same marks are then written to a scratch SQLite table to time a full
+rebuild from SQL, and how long live marks wait while it runs.
+
+    python bench_cube.py [students] [days]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from analytics_cube import AttendanceCube, period_masks
+from timetable import PERIODS, hour_for_period
+
+
+def timed(label, fn, repeat=20):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"{label:<32} {ms:9.3f} ms")
+    return result
+
+
+def synthetic(n_students, n_days, seed=7):
+    rng = np.random.default_rng(seed)
+    students = [f"STUDENT {i:05d}" for i in range(n_students)]
+    dates, d = [], date(2025, 6, 2)
+    while len(dates) < n_days:
+        if d.weekday() < 6:
+            dates.append(d.isoformat())
+        d += timedelta(days=1)
+
+    # Per-student rate of showing up at all, skewed so some fall under 75%,
+    # then a 90% chance of being marked in each period of a day attended
+    rate = np.clip(rng.normal(0.85, 0.08, size=(n_students, 1)), 0.3, 1.0)
+    days = rng.random((n_students, n_days)) < rate
+    present = days[..., None] & (rng.random((n_students, n_days, PERIODS)) < 0.9)
+    bits = np.packbits(present, axis=-1, bitorder="little")[..., 0]
+    return students, dates, bits
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    students, dates, bits = synthetic(n_students, n_days)
+
+    cube = AttendanceCube()
+    start = time.perf_counter()
+    cube.load_matrix(students, dates, bits)
+    print(f"{n_students} students x {n_days} days x {PERIODS} periods, "
+          f"{cube.nbytes() / 1e6:.1f} MB, loaded in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    who = students[n_students // 2]
+    timed("attendance percentages", cube.percentages)
+    below = timed("below 75% list", cube.below)
+    timed("most skipped period", cube.most_skipped_period)
+    timed("weekday heatmap (all)", cube.weekday_heatmap)
+    timed("weekday heatmap (one)", lambda: cube.weekday_heatmap(who))
+    timed("profile summary + leave dates", lambda: cube.student_summary(who))
+    timed("occupancy on a date", lambda: cube.present_on(dates[-1]))
+    timed("live mark", lambda: cube.mark(who, dates[-1], "09:15:00"), repeat=10000)
+    print(f"\n{len(below)} students under 75%\n")
+
+    bench_sql_load(students, dates, bits, who)
+
+
+def bench_sql_load(students, dates, bits, who):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "attendance.db"), check_same_thread=False)
+        # Same table and index as the live attendance table in app.py
+        conn.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "name TEXT, date TEXT, time TEXT)")
+        conn.execute("CREATE INDEX idx_attendance_name_date ON attendance (name, date)")
+        si, dj, p = np.nonzero(np.unpackbits(bits[..., None], axis=-1, bitorder="little")[..., :PERIODS])
+        conn.executemany("INSERT INTO attendance (name, date, time) VALUES (?, ?, ?)",
+                         ((students[i], dates[j], f"{hour_for_period(k + 1):02d}:15:00")
+                          for i, j, k in zip(si.tolist(), dj.tolist(), p.tolist())))
+        conn.commit()
+        print(f"{len(si)} attendance rows in SQLite")
+
+        cube = AttendanceCube(lambda: period_masks(conn))
+        start = time.perf_counter()
+        cube.ensure_loaded()
+        print(f"{'rebuild from SQL':<32} {(time.perf_counter() - start) * 1000:9.1f} ms")
+        assert np.array_equal(cube._view(), bits), "SQL rebuild differs from the source matrix"
+
+        # Live marks keep landing while a rebuild runs on another thread
+        cube.invalidate()
+        loader = threading.Thread(target=cube.ensure_loaded)
+        loader.start()
+        waits = []
+        while loader.is_alive():
+            start = time.perf_counter()
+            cube.mark(who, dates[-1], "09:15:00")
+            waits.append(time.perf_counter() - start)
+            time.sleep(0.001)
+        loader.join()
+        print(f"{'live mark during rebuild (max)':<32} {max(waits) * 1000:9.3f} ms over {len(waits)} marks")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
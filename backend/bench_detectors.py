@@ -0,0 +1,108 @@
+"""Compare face detector backends on the same set of frames.
+
+With --frames DIR every image in DIR is used and the report gives faces
+found per frame. Without it, frames are synthesised by pasting the enrolled
+gallery crops from data/encodings.pkl at random sizes and positions onto
+textured backgrounds; the boxes are known, so detection rate is reported too.
+
+    python bench_detectors.py [--frames DIR] [--count 50] [--backends haar,lbp,dnn]
+"""
+import argparse
+import os
+import pickle
+import time
+
+import cv2
+import numpy as np
+
+from detectors import BACKENDS, create_detector
+
+
+def load_frames(directory):
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            frames.append((img, None))
+    return frames
+
+
+def synthetic_frames(count, encodings_file, seed=3):
+    rng = np.random.default_rng(seed)
+    with open(encodings_file, "rb") as f:
+        gallery = [(np.asarray(e).reshape(100, 100) * 255).astype(np.uint8)
+                   for e in pickle.load(f).values() if np.asarray(e).size == 10000]
+    if not gallery:
+        raise SystemExit(f"No 100x100 crops in {encodings_file}, pass --frames instead")
+
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 255, (60, 80), dtype=np.uint8)
+        frame = cv2.GaussianBlur(cv2.resize(noise, (640, 480)), (0, 0), 6)
+        boxes = []
+        for _ in range(rng.integers(1, 4)):
+            size = int(rng.integers(90, 220))
+            x, y = int(rng.integers(0, 640 - size)), int(rng.integers(0, 480 - size))
+            if any(x < bx + bs and bx < x + size and y < by + bs and by < y + size for bx, by, bs, _ in boxes):
+                continue
+            frame[y:y + size, x:x + size] = cv2.resize(gallery[rng.integers(len(gallery))], (size, size))
+            boxes.append((x, y, size, size))
+        frames.append((frame, boxes))
+    return frames
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def run(detector, frames):
+    latencies, found, truth, hits, false_pos = [], 0, 0, 0, 0
+    detector.detect(frames[0][0])
+    for frame, boxes in frames:
+        start = time.perf_counter()
+        faces = detector.detect(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len(faces)
+        if boxes is not None:
+            truth += len(boxes)
+            matched = [any(iou(tuple(f), b) > 0.3 for f in faces) for b in boxes]
+            hits += sum(matched)
+            false_pos += sum(1 for f in faces if not any(iou(tuple(f), b) > 0.3 for b in boxes))
+    lat = np.array(latencies)
+    row = f"{detector.name:<6} {lat.mean():8.2f} {np.percentile(lat, 50):8.2f} {np.percentile(lat, 95):8.2f} {found / len(frames):10.2f}"
+    if truth:
+        row += f" {hits / truth * 100:9.1f}% {false_pos:8d}"
+    print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="directory of frames to use instead of synthetic ones")
+    parser.add_argument("--count", type=int, default=50, help="number of synthetic frames")
+    parser.add_argument("--encodings", default="data/encodings.pkl")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames(args.count, args.encodings)
+    print(f"{len(frames)} frames, {frames[0][0].shape[1]}x{frames[0][0].shape[0]}\n")
+    header = f"{'name':<6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'faces/frm':>10}"
+    if frames[0][1] is not None:
+        header += f" {'detected':>10} {'false +':>8}"
+    print(header)
+
+    for name in args.backends.split(","):
+        try:
+            detector = create_detector(name)
+        except Exception as e:
+            print(f"{name:<6} unavailable: {e}")
+            continue
+        run(detector, frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import atexit
+import re
+import sqlite3
+import threading
+import time
+
+from timetable import hour_for_period
+
+ADMIN_FALLBACK = "I'm sorry, I didn't understand the query. Try asking 'who is absent in period 1' or 'how many present today'."
+STUDENT_FALLBACK = "I'm sorry, I didn't understand. If you have an issue, you can say 'raise attendance complaint' or 'what is my attendance'."
+
+# Intents are tried in order, first match wins. Lookaheads keep the old
+# "contains all of these words, in any order" substring semantics.
+ADMIN_INTENTS = [
+    ("absent_in_period", re.compile(r"absent.*period\s*(\d)|period\s*(\d).*absent")),
+    ("present_count", re.compile(r"^(?=.*(?:how many|total|count))(?=.*present)", re.S)),
+]
+
+STUDENT_INTENTS = [
+    ("my_percentage", re.compile(r"percentage|attendance|how much|my record")),
+    ("complaint", re.compile(r"complaint|issue|problem|report")),
+    ("present_today", re.compile(r"^(?=.*today)(?=.*(?:present|here))", re.S)),
+    ("periods_today", re.compile(r"^(?=.*today)(?=.*period)", re.S)),
+]
+
+
+def route(intents, query):
+    for intent, pattern in intents:
+        m = pattern.search(query)
+        if m:
+            return intent, m
+    return None, None
+
+
+class AnswerCache:
+    """Short-lived answers for the current day, dropped on any attendance write."""
+
+    def __init__(self, ttl=30.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ChatLogWriter:
+    """Buffers chat_logs rows and writes them in one transaction per batch."""
+
+    def __init__(self, db_file, batch_size=20, interval=2.0):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        atexit.register(self.flush)
+
+    def log(self, role, query, response, date, time_str):
+        with self.lock:
+            self.pending.append((role, query, response, date, time_str))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+                self.thread.start()
+            if len(self.pending) >= self.batch_size:
+                self.wake.set()
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.executemany("INSERT INTO chat_logs (role, query, response, date, time) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"DEBUG: Failed to write {len(rows)} chat logs: {e}")
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+
+def answer_admin(c, cache, query, today):
+    intent, m = route(ADMIN_INTENTS, query)
+
+    if intent == "absent_in_period":
+        period = int(m.group(1) or m.group(2))
+        key = (intent, today, period)
+        response = cache.get(key)
+        if response is None:
+            hour_target = hour_for_period(period)
+            time_like = f"{hour_target:02d}:%"
+            c.execute("""
+                SELECT upper(name) FROM students
+                WHERE upper(name) NOT IN (
+                    SELECT upper(name) FROM attendance
+                    WHERE date=? AND time LIKE ? AND name IS NOT NULL
+                )
+                ORDER BY id
+            """, (today, time_like))
+            absent = [row[0] for row in c.fetchall()]
+            response = f"Students absent in Period {period} today: {', '.join(absent) if absent else 'None, all present!'}"
+            cache.put(key, response)
+        return response
+
+    if intent == "present_count":
+        key = (intent, today)
+        response = cache.get(key)
+        if response is None:
+            c.execute("SELECT COUNT(DISTINCT name) FROM attendance WHERE date=?", (today,))
+            count = c.fetchone()[0]
+            response = f"{count} students were marked present today."
+            cache.put(key, response)
+        return response
+
+    return ADMIN_FALLBACK
+
+
+def answer_student(c, cache, name, query, today):
+    intent, _ = route(STUDENT_INTENTS, query)
+
+    if intent == "complaint":
+        c.execute("INSERT INTO complaints (student_name, complaint, date) VALUES (?, ?, ?)", (name, query, today))
+        c.connection.commit()
+        return "Your complaint has been logged and will be forwarded to the admin."
+
+    if intent is None:
+        return STUDENT_FALLBACK
+
+    key = (intent, today, name)
+    response = cache.get(key)
+    if response is not None:
+        return response
+
+    if intent == "my_percentage":
+        c.execute("SELECT COUNT(DISTINCT date) FROM attendance_all")
+        total = c.fetchone()[0]
+        c.execute("SELECT COUNT(DISTINCT date) FROM attendance_all WHERE name=?", (name,))
+        present = c.fetchone()[0]
+        pct = round((present/total)*100, 2) if total > 0 else 0
+        response = f"Your current attendance percentage is {pct}%. You have attended {present} out of {total} days."
+    else:
+        c.execute("SELECT COUNT(*) FROM attendance WHERE name=? AND date=?", (name, today))
+        count = c.fetchone()[0]
+        if intent == "periods_today":
+            response = f"You were marked present for {count} period(s) today."
+        elif count > 0:
+            response = f"Yes, you were marked present for {count} period(s) today."
+        else:
+            response = "No, you have not been marked present today."
+
+    cache.put(key, response)
+    return response
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def crop_hash(encoding):
+    """128-bit difference hash of a normalized 100x100 face crop.
+
+    Horizontal and vertical gradients of an 8x8 thumbnail, so small shifts in
+    lighting or framing flip only a few bits. None for odd-shaped encodings.
+    """
+    if getattr(encoding, "size", 0) != 100 * 100:
+        return None
+    img = np.asarray(encoding, dtype=np.float32).reshape(100, 100)
+    h = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    v = cv2.resize(img, (8, 9), interpolation=cv2.INTER_AREA)
+    bits = np.concatenate([(h[:, 1:] > h[:, :-1]).ravel(), (v[1:, :] > v[:-1, :]).ravel()])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class CropCache:
+    """Per-session LRU from crop hash to the identity it last matched.
+
+    A session is one camera (its client key). Lookups accept any cached hash
+    within ``max_distance`` bits, which covers the small frame-to-frame noise
+    of a student sitting still. Entries also remember the minute attendance
+    was last marked for them, so repeats within that minute skip the dedup
+    query as well as the gallery match.
+    """
+
+    def __init__(self, ttl=30.0, max_distance=6, max_entries=64, max_sessions=256):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _find(self, entries, key, now):
+        entry = entries.get(key)
+        if entry is not None:
+            return key, entry, False
+        for k, e in entries.items():
+            if e[2] >= now and (k ^ key).bit_count() <= self.max_distance:
+                return k, e, True
+        return None, None, False
+
+    def get(self, session, key):
+        """[name, marked_minute, expires] for a near-duplicate crop, else None."""
+        if key is None:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entries = self.sessions.get(session)
+            if entries is None:
+                self.misses += 1
+                return None
+            k, entry, near = self._find(entries, key, now)
+            if entry is None or entry[2] < now:
+                if k is not None:
+                    del entries[k]
+                self.misses += 1
+                return None
+            entries.move_to_end(k)
+            self.sessions.move_to_end(session)
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, session, key, name, marked_minute=None):
+        if key is None:
+            return
+        with self.lock:
+            entries = self.sessions.get(session)
+            if entries is None:
+                entries = self.sessions[session] = OrderedDict()
+                if len(self.sessions) > self.max_sessions:
+                    self.evictions += len(self.sessions.popitem(last=False)[1])
+            self.sessions.move_to_end(session)
+            entries[key] = [name, marked_minute, time.monotonic() + self.ttl]
+            entries.move_to_end(key)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self.lock:
+            self.sessions.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "sessions": len(self.sessions),
+            "entries": sum(len(e) for e in list(self.sessions.values())),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,155 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+# pip wheels of OpenCV only ship the Haar cascades, so the LBP one is bundled
+# in models/; the system paths cover an opencv-data install.
+LBP_CASCADE_PATHS = [
+    os.path.join(MODELS_DIR, "lbpcascade_frontalface_improved.xml"),
+    "/usr/share/opencv4/lbpcascades/lbpcascade_frontalface_improved.xml",
+    "/usr/share/opencv4/lbpcascades/lbpcascade_frontalface.xml",
+    "/usr/share/opencv/lbpcascades/lbpcascade_frontalface.xml",
+    os.path.join(cv2.data.haarcascades, "..", "lbpcascades", "lbpcascade_frontalface_improved.xml"),
+]
+
+
+class FaceDetector:
+    """Finds faces in a grayscale frame and returns them as (x, y, w, h) rows.
+
+    One detector is shared by every request thread, but cascades and DNN nets
+    keep scratch buffers between calls and give wrong boxes when run
+    concurrently, so each thread lazily loads its own copy of the model.
+    """
+
+    name = None
+
+    def __init__(self, threads=-1):
+        # OpenCV's thread pool is process-wide, so each backend re-applies its
+        # own setting before running; -1 keeps OpenCV's default
+        self.threads = threads
+        self.local = threading.local()
+
+    def model(self):
+        model = getattr(self.local, "model", None)
+        if model is None:
+            model = self.local.model = self._load()
+        return model
+
+    def detect(self, gray):
+        cv2.setNumThreads(self.threads)
+        return self._detect(self.model(), gray)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _detect(self, model, gray):
+        raise NotImplementedError
+
+
+class CascadeDetector(FaceDetector):
+    def __init__(self, path, threads=-1, scale_factor=1.1, min_neighbors=3):
+        super().__init__(threads)
+        self.path = path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.model()  # fail at startup, not on the first frame
+
+    def _load(self):
+        cascade = cv2.CascadeClassifier(self.path)
+        if cascade.empty():
+            raise RuntimeError(f"Could not load cascade from {self.path}")
+        return cascade
+
+    def _detect(self, cascade, gray):
+        return cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+
+
+class HaarDetector(CascadeDetector):
+    name = "haar"
+
+    def __init__(self, threads=-1):
+        super().__init__(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml', threads)
+
+
+class LbpDetector(CascadeDetector):
+    name = "lbp"
+
+    def __init__(self, threads=-1, path=None):
+        path = path or next((p for p in LBP_CASCADE_PATHS if os.path.isfile(p)), None)
+        if path is None:
+            raise RuntimeError("No LBP cascade found, restore models/lbpcascade_frontalface_improved.xml or set LBP_CASCADE_PATH")
+        super().__init__(path, threads)
+
+
+class DnnDetector(FaceDetector):
+    """CenterFace run through OpenCV's DNN module on the CPU.
+
+    Frames are scaled to ``input_width`` (rounded to the network stride of 32)
+    before inference; smaller inputs trade the tiniest faces for speed.
+    """
+
+    name = "dnn"
+    OUTPUTS = ["537", "538", "539", "540"]
+
+    def __init__(self, threads=-1, model_path=None, input_width=320, threshold=0.5, nms_threshold=0.3):
+        super().__init__(threads)
+        self.model_path = model_path or os.path.join(MODELS_DIR, "centerface.onnx")
+        self.input_width = input_width
+        self.threshold = threshold
+        self.nms_threshold = nms_threshold
+        self.model()
+
+    def _load(self):
+        net = cv2.dnn.readNetFromONNX(self.model_path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+
+    def _detect(self, net, gray):
+        h, w = gray.shape[:2]
+        in_w = int(np.ceil(min(self.input_width, w) / 32) * 32)
+        in_h = int(np.ceil(in_w * h / w / 32) * 32)
+        img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        net.setInput(cv2.dnn.blobFromImage(img, 1.0, (in_w, in_h), (0, 0, 0), swapRB=False, crop=False))
+        heatmap, scale, offset, _ = net.forward(self.OUTPUTS)
+
+        ys, xs = np.nonzero(heatmap[0, 0] > self.threshold)
+        if len(ys) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        scores = heatmap[0, 0, ys, xs]
+        bh = np.exp(scale[0, 0, ys, xs]) * 4
+        bw = np.exp(scale[0, 1, ys, xs]) * 4
+        cy = (ys + offset[0, 0, ys, xs] + 0.5) * 4
+        cx = (xs + offset[0, 1, ys, xs] + 0.5) * 4
+        sx, sy = w / in_w, h / in_h
+        x1 = np.clip((cx - bw / 2) * sx, 0, w)
+        y1 = np.clip((cy - bh / 2) * sy, 0, h)
+        boxes = np.stack([x1, y1, np.minimum(bw * sx, w - x1), np.minimum(bh * sy, h - y1)], axis=1)
+
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.threshold, self.nms_threshold)
+        return boxes[np.asarray(keep, dtype=np.int64).reshape(-1)].astype(np.int32)
+
+
+BACKENDS = {cls.name: cls for cls in (HaarDetector, LbpDetector, DnnDetector)}
+
+
+def create_detector(name=None):
+    """Build the backend named by FACE_DETECTOR (haar, lbp or dnn).
+
+    Threads come from FACE_DETECTOR_THREADS_<NAME>, e.g. FACE_DETECTOR_THREADS_DNN=4.
+    """
+    name = (name or os.environ.get("FACE_DETECTOR", "haar")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown face detector '{name}', expected one of {', '.join(BACKENDS)}")
+    threads = int(os.environ.get(f"FACE_DETECTOR_THREADS_{name.upper()}", "-1"))
+    kwargs = {}
+    if name == "lbp" and os.environ.get("LBP_CASCADE_PATH"):
+        kwargs["path"] = os.environ["LBP_CASCADE_PATH"]
+    if name == "dnn":
+        kwargs["input_width"] = int(os.environ.get("DNN_INPUT_WIDTH", "320"))
+        kwargs["threshold"] = float(os.environ.get("DNN_THRESHOLD", "0.5"))
+    return BACKENDS[name](threads=threads, **kwargs)
@@ -0,0 +1,186 @@
+import ctypes
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+MAX_PROFILE_SECONDS = 60
+MIN_PROFILE_INTERVAL = 0.005
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler over every thread in the process.
+
+    A background thread reads ``sys._current_frames()`` every ``interval``
+    seconds and counts each stack, so request threads are never paused or
+    instrumented. Results are folded stacks (``root;...;leaf count``), the
+    input format of flamegraph.pl and speedscope. One capture at a time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.status = "idle"
+        self.started = None
+        self.seconds = 0
+        self.interval = 0
+        self.samples = 0
+        self.stacks = Counter()
+
+    def start(self, seconds=10, interval=0.01):
+        seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+        interval = max(float(interval), MIN_PROFILE_INTERVAL)
+        with self.lock:
+            if self.status == "running":
+                raise RuntimeError("A profile is already running")
+            self.status = "running"
+            self.started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.seconds = seconds
+            self.interval = interval
+            self.samples = 0
+            self.stacks = Counter()
+            self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.thread.start()
+        return self.to_dict()
+
+    @staticmethod
+    def _fold(frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        stacks = Counter()
+        samples = 0
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident != me:
+                    stacks[names.get(ident, str(ident)) + ";" + self._fold(frame)] += 1
+            del frames
+            samples += 1
+            time.sleep(self.interval)
+        with self.lock:
+            self.stacks = stacks
+            self.samples = samples
+            self.status = "done"
+
+    def folded(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=20):
+        # Leaf frames only: where threads actually were, not who called them
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [{"function": f, "samples": n} for f, n in leaves.most_common(limit)]
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "started": self.started,
+            "seconds": self.seconds,
+            "interval": self.interval,
+            "samples": self.samples,
+        }
+
+
+class AllocationTracer:
+    """tracemalloc on demand, switched off again after ``max_seconds``.
+
+    Tracing slows every allocation, so it only runs while someone is
+    looking, and never longer than the limit.
+    """
+
+    def __init__(self, max_seconds=300):
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+        self.timer = None
+        self.started = None
+
+    def start(self, frames=10):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, min(int(frames), 50)))
+                self.started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.max_seconds, self.stop)
+            self.timer.daemon = True
+            self.timer.start()
+        return self.status()
+
+    def stop(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            tracemalloc.stop()
+            self.started = None
+        return self.status()
+
+    def status(self):
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {"tracing": tracing, "started": self.started, "traced_bytes": current, "peak_bytes": peak,
+                "max_seconds": self.max_seconds}
+
+    def top(self, limit=20, group_by="lineno"):
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        stats = snapshot.statistics("traceback" if group_by == "traceback" else "lineno")
+        return [{"size": s.size, "count": s.count, "traceback": [str(f) for f in s.traceback.format()]}
+                for s in stats[:limit]]
+
+
+def _sqlite_lib():
+    # The C library behind the sqlite3 module; its memory counters cover the
+    # page cache and statements of every connection in the process.
+    try:
+        import _sqlite3
+        lib = ctypes.CDLL(_sqlite3.__file__)
+        lib.sqlite3_memory_used.restype = ctypes.c_int64
+        lib.sqlite3_memory_highwater.restype = ctypes.c_int64
+        lib.sqlite3_memory_highwater.argtypes = [ctypes.c_int]
+        return lib
+    except (ImportError, OSError, AttributeError):
+        return None
+
+
+_sqlite = _sqlite_lib()
+
+
+def sqlite_memory():
+    if _sqlite is None:
+        return None
+    return {"used_bytes": _sqlite.sqlite3_memory_used(), "peak_bytes": _sqlite.sqlite3_memory_highwater(0)}
+
+
+def process_memory():
+    """RSS and peak RSS from /proc where available, plus interpreter counters."""
+    info = {"threads": threading.active_count(), "gc_counts": list(gc.get_count())}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "VmSize"):
+                    info[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return info
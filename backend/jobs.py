@@ -0,0 +1,287 @@
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from archive import archive_month, attendance_tables, months_to_archive
+
+# Rows rewritten per transaction; small enough that live attendance inserts
+# only ever wait on one chunk for the write lock.
+CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', '500'))
+CHUNK_PAUSE = 0.01
+MAX_FINISHED_JOBS = 100
+
+
+def write_encodings(path, encodings):
+    # Write to a temp file in the same directory and swap it in, so readers
+    # never see a half-written pickle.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(encodings, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _chunked(conn, sql, params, progress):
+    # sql must affect at most CHUNK_SIZE rows per call (via a LIMITed id subquery)
+    done = 0
+    while True:
+        cur = conn.execute(sql, params + (CHUNK_SIZE,))
+        conn.commit()
+        if cur.rowcount <= 0:
+            return done
+        done += cur.rowcount
+        progress(cur.rowcount)
+        time.sleep(CHUNK_PAUSE)
+
+
+def _count(conn, names):
+    placeholders = ",".join("?" * len(names))
+    return sum(conn.execute(f"SELECT COUNT(*) FROM {table} WHERE name IN ({placeholders})", tuple(names)).fetchone()[0]
+               for table in attendance_tables(conn))
+
+
+def _rename_rows(conn, name, new_name, progress):
+    return sum(_chunked(conn,
+                        f"UPDATE {table} SET name=? WHERE id IN (SELECT id FROM {table} WHERE name=? LIMIT ?)",
+                        (new_name, name), progress)
+               for table in attendance_tables(conn))
+
+
+def rename_profile(conn, update_gallery, name, new_name):
+    """Rename the students row and gallery entry; quick enough to run inline."""
+    if new_name == name:
+        raise ValueError("New name is the same as the current name")
+    exists = conn.execute("SELECT 1 FROM students WHERE name=?", (new_name,)).fetchone()
+    if exists:
+        raise ValueError(f"{new_name} already exists, use a merge instead")
+
+    conn.execute("UPDATE students SET name=? WHERE name=?", (new_name, name))
+    conn.commit()
+
+    def mutate(encodings):
+        if name in encodings:
+            encodings[new_name] = encodings.pop(name)
+    update_gallery(mutate)
+
+
+def rename_history(conn, update_gallery, progress, name, new_name):
+    if new_name == name:
+        # The chunked UPDATE would keep matching the same rows forever
+        raise ValueError("New name is the same as the current name")
+    progress(0, _count(conn, [name]))
+    return _rename_rows(conn, name, new_name, progress)
+
+
+def rename_student(conn, update_gallery, progress, name, new_name):
+    rename_profile(conn, update_gallery, name, new_name)
+    return rename_history(conn, update_gallery, progress, name, new_name)
+
+
+def merge_students(conn, update_gallery, progress, target, sources):
+    sources = [s for s in sources if s != target]
+    if not sources:
+        raise ValueError("Nothing to merge")
+
+    progress(0, _count(conn, sources))
+
+    # Keep the target's details, falling back to the first duplicate that has some
+    c = conn.cursor()
+    c.execute("SELECT details FROM students WHERE name=?", (target,))
+    row = c.fetchone()
+    if row is None:
+        details = ""
+        for s in sources:
+            c.execute("SELECT details FROM students WHERE name=?", (s,))
+            src = c.fetchone()
+            if src and src[0]:
+                details = src[0]
+                break
+        c.execute("INSERT INTO students (name, details) VALUES (?, ?)", (target, details))
+    c.execute(f"DELETE FROM students WHERE name IN ({','.join('?' * len(sources))})", tuple(sources))
+    conn.commit()
+
+    def mutate(encodings):
+        for s in sources:
+            enc = encodings.pop(s, None)
+            if enc is not None and target not in encodings:
+                encodings[target] = enc
+    update_gallery(mutate)
+
+    return sum(_rename_rows(conn, s, target, progress) for s in sources)
+
+
+def purge_student(conn, update_gallery, progress, name):
+    # Case-insensitive, like clean_data.py always was: resolve the exact
+    # spellings once, then delete by the indexed name column.
+    c = conn.cursor()
+    c.execute("SELECT name FROM students WHERE lower(name)=lower(?)", (name,))
+    names = {r[0] for r in c.fetchall()}
+    for table in attendance_tables(conn):
+        c.execute(f"SELECT DISTINCT name FROM {table} WHERE lower(name)=lower(?)", (name,))
+        names.update(r[0] for r in c.fetchall())
+
+    def mutate(encodings):
+        for k in [k for k in encodings if k.lower() == name.lower()]:
+            del encodings[k]
+    update_gallery(mutate)
+
+    if not names:
+        progress(0, 0)
+        return 0
+
+    names = sorted(names)
+    progress(0, _count(conn, names))
+    c.execute(f"DELETE FROM students WHERE name IN ({','.join('?' * len(names))})", tuple(names))
+    conn.commit()
+
+    done = 0
+    for table in attendance_tables(conn):
+        for n in names:
+            done += _chunked(conn,
+                             f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE name=? LIMIT ?)",
+                             (n,), progress)
+    return done
+
+
+def archive_closed_months(conn, update_gallery, progress, keep_months):
+    months = months_to_archive(conn, int(keep_months))
+    progress(0, len(months))
+    moved = 0
+    for ym in months:
+        moved += archive_month(conn, ym)
+        progress(1)
+        time.sleep(CHUNK_PAUSE)
+    return moved
+
+
+# Job type -> (function, {param: expected type}); list params are lists of strings
+OPERATIONS = {
+    "rename": (rename_student, {"name": str, "new_name": str}),
+    # Attendance rows only, after rename_profile() has already run
+    "rename_history": (rename_history, {"name": str, "new_name": str}),
+    "merge": (merge_students, {"target": str, "sources": list}),
+    "purge": (purge_student, {"name": str}),
+    "archive": (archive_closed_months, {"keep_months": int}),
+}
+
+
+def _check_params(required, params):
+    missing = [p for p in required if not params.get(p)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    for p, kind in required.items():
+        value = params[p]
+        if kind is list:
+            ok = isinstance(value, list) and all(isinstance(v, str) and v for v in value)
+            expected = "a list of names"
+        else:
+            ok = isinstance(value, kind) and not isinstance(value, bool)
+            expected = "a number" if kind is int else "a string"
+        if not ok:
+            raise ValueError(f"{p} must be {expected}")
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.total = None
+        self.done = 0
+        self.message = ""
+        self.created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.finished = None
+
+    def progress(self, rows, total=None):
+        if total is not None:
+            self.total = total
+        self.done += rows
+
+    def to_dict(self):
+        percent = None
+        if self.total:
+            percent = round(min(self.done, self.total) * 100.0 / self.total, 1)
+        elif self.status == "done":
+            percent = 100.0
+        return {
+            "id": self.id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "percent": percent,
+            "message": self.message,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobManager:
+    """Runs bulk student operations one at a time on a background thread."""
+
+    def __init__(self, connect, update_gallery, on_change=None):
+        self.connect = connect
+        self.update_gallery = update_gallery
+        self.on_change = on_change
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def submit(self, kind, **params):
+        if kind not in OPERATIONS:
+            raise ValueError(f"Unknown job type: {kind}")
+        _, required = OPERATIONS[kind]
+        _check_params(required, params)
+        if kind in ("rename", "rename_history") and params["name"] == params["new_name"]:
+            raise ValueError("New name is the same as the current name")
+
+        job = Job(kind, {k: params[k] for k in required})
+        with self.lock:
+            self.jobs[job.id] = job
+            self._trim()
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name="job-worker", daemon=True)
+                self.worker.start()
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return [j.to_dict() for j in sorted(self.jobs.values(), key=lambda j: j.created, reverse=True)]
+
+    def _trim(self):
+        finished = [j for j in self.jobs.values() if j.status in ("done", "failed")]
+        for j in sorted(finished, key=lambda j: j.created)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[j.id]
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            fn, _ = OPERATIONS[job.kind]
+            job.status = "running"
+            conn = self.connect(timeout=30)
+            try:
+                rows = fn(conn, self.update_gallery, job.progress, **job.params)
+                job.status = "done"
+                job.message = f"{rows} attendance rows {'archived' if job.kind == 'archive' else 'updated'}"
+            except Exception as e:
+                job.status = "failed"
+                job.message = str(e)
+            finally:
+                conn.close()
+                job.finished = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if self.on_change:
+                    self.on_change()
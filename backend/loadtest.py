@@ -0,0 +1,343 @@
+"""Load test: simulated classroom cameras and dashboards against one instance.
+
+Starts the app on a throwaway copy of the data in a temp directory, with
+the enrolled gallery padded by --gallery synthetic students and
+--history-days of attendance, then ramps the number of cameras. Each
+camera posts a frame to /attendance every 1/--fps seconds while
+--dashboards clients poll /report, /students and /api/analytics/*.
+
+Every step reports offered vs achieved frame throughput, latency
+percentiles, errors, load shedding (429/503) and SQLite lock errors. The
+saturation point is the first step where throughput falls below 90% of
+offered, frame p95 exceeds --slo-ms, or errors pass 1%.
+
+    python loadtest.py [--ramp 1,2,4,8,16] [--duration 30] [--fps 0.33]
+                       [--dashboards 10] [--poll 5] [--server gunicorn|asgi]
+                       [--threads 4] [--frames DIR] [--gallery 200] [--json out.json]
+    python loadtest.py --url http://host:5000 ...   (existing server, its own data)
+
+Frames come from --frames DIR, or are synthesised from the enrolled crops
+the same way bench_detectors.py does.
+"""
+import argparse
+import base64
+import json
+import os
+import pickle
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+import cv2
+import numpy as np
+
+from bench_detectors import load_frames, synthetic_frames
+from jobs import write_encodings
+from timetable import PERIODS, hour_for_period
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Enrolled crops: copied into the throwaway gallery and used to synthesise frames
+ENCODING_FILE = os.path.join(BACKEND_DIR, "data", "encodings.pkl")
+DASHBOARD_PATHS = ["/report", "/students", "/api/analytics/intelligence", "/api/analytics/heatmap"]
+ADMIN_USER = "loadtest"
+ADMIN_PASSWORD = "loadtest"
+
+
+# ---- throwaway instance ----
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_data(workdir, extra_students, seed=11):
+    """Copy the enrolled gallery into workdir and pad it with random encodings."""
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    gallery = {}
+    if os.path.exists(ENCODING_FILE):
+        with open(ENCODING_FILE, "rb") as f:
+            gallery = pickle.load(f)
+    rng = np.random.default_rng(seed)
+    for i in range(extra_students):
+        gallery[f"LOADTEST {i:05d}"] = rng.random(100 * 100)
+    write_encodings(os.path.join(workdir, "data", "encodings.pkl"), gallery)
+    return sorted(gallery)
+
+
+def start_server(workdir, mode, port, workers, threads, env):
+    if mode == "asgi":
+        cmd = [sys.executable, "-m", "uvicorn", "--app-dir", BACKEND_DIR, "asgi:app",
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(threads),
+               "-b", f"127.0.0.1:{port}", "--timeout", "60", "--chdir", workdir,
+               "--pythonpath", BACKEND_DIR, "app:app"]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_healthy(base, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"Server exited with {proc.returncode}, see server.log")
+        try:
+            with urllib.request.urlopen(base + "/health", timeout=2):
+                return
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.5)
+    raise SystemExit("Server did not become healthy")
+
+
+def seed_history(db_file, names, days, seed=5):
+    """Roster rows plus about 85% attendance over the last `days` weekdays."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.executemany("INSERT OR IGNORE INTO students (name, details) VALUES (?, ?)",
+                     [(n, "Load test") for n in names])
+    rows = []
+    day = date.today()
+    seeded = 0
+    while seeded < days:
+        day -= timedelta(days=1)
+        if day.weekday() >= 5:
+            continue
+        seeded += 1
+        for n in names:
+            if rng.random() < 0.85:
+                for p in rng.sample(range(1, PERIODS + 1), rng.randint(1, PERIODS)):
+                    rows.append((n, day.isoformat(), f"{hour_for_period(p):02d}:{rng.randint(0, 59):02d}:00"))
+    conn.executemany("INSERT INTO attendance (name, date, time) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+# ---- clients ----
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def add(self, kind, seconds, status, locked):
+        with self.lock:
+            self.samples.append((kind, seconds, status, locked))
+
+    def take(self):
+        with self.lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+
+def request(base, path, body=None, headers=None, timeout=60):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base + path, data=data, headers={"Content-Type": "application/json", **(headers or {})})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        status = e.code
+    except OSError:
+        return time.perf_counter() - start, 0, b""
+    return time.perf_counter() - start, status, payload
+
+
+def camera(base, camera_id, frames, fps, stop, recorder):
+    interval = 1.0 / fps
+    headers = {"X-Client-Id": f"loadtest-camera-{camera_id}"}
+    # Stagger start so cameras don't fire in lockstep
+    next_at = time.monotonic() + random.random() * interval
+    i = camera_id
+    while not stop.is_set():
+        delay = next_at - time.monotonic()
+        if delay > 0 and stop.wait(delay):
+            break
+        next_at += interval
+        seconds, status, payload = request(base, "/attendance", {"image": frames[i % len(frames)]}, headers)
+        recorder.add("frame", seconds, status, b"database is locked" in payload)
+        i += 1
+
+
+def dashboard(base, token, poll, stop, recorder):
+    headers = {"Authorization": f"Bearer {token}"}
+    stop.wait(random.random() * poll)
+    while not stop.is_set():
+        for path in DASHBOARD_PATHS:
+            seconds, status, payload = request(base, path, headers=headers)
+            recorder.add("dashboard", seconds, status, b"database is locked" in payload)
+        stop.wait(poll)
+
+
+def summarize(samples, kind, duration):
+    rows = [s for s in samples if s[0] == kind]
+    ok = [s[1] for s in rows if 200 <= s[2] < 300]
+    lat = np.array(ok) * 1000 if ok else np.zeros(1)
+    return {
+        "requests": len(rows),
+        "ok_per_second": round(len(ok) / duration, 2),
+        "p50_ms": round(float(np.percentile(lat, 50)), 1),
+        "p95_ms": round(float(np.percentile(lat, 95)), 1),
+        "p99_ms": round(float(np.percentile(lat, 99)), 1),
+        "error_rate": round(sum(1 for s in rows if s[2] == 0 or (s[2] >= 500 and s[2] != 503)) / max(1, len(rows)), 4),
+        "shed_rate": round(sum(1 for s in rows if s[2] in (429, 503)) / max(1, len(rows)), 4),
+        "lock_rate": round(sum(1 for s in rows if s[3]) / max(1, len(rows)), 4),
+    }
+
+
+def run_step(base, token, frames, cameras, args):
+    stop = threading.Event()
+    recorder = Recorder()
+    threads = [threading.Thread(target=camera, args=(base, i, frames, args.fps, stop, recorder), daemon=True)
+               for i in range(cameras)]
+    threads += [threading.Thread(target=dashboard, args=(base, token, args.poll, stop, recorder), daemon=True)
+                for _ in range(args.dashboards)]
+    for t in threads:
+        t.start()
+    # Let every client get going before measuring
+    time.sleep(min(5.0, 1.0 / args.fps))
+    recorder.take()
+    start = time.monotonic()
+    time.sleep(args.duration)
+    samples = recorder.take()
+    elapsed = time.monotonic() - start
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+
+    step = {"cameras": cameras, "offered_frames_per_second": round(cameras * args.fps, 2),
+            "frames": summarize(samples, "frame", elapsed), "dashboards": summarize(samples, "dashboard", elapsed)}
+    return step
+
+
+def saturated(step, slo_ms):
+    frames = step["frames"]
+    if frames["ok_per_second"] < 0.9 * step["offered_frames_per_second"]:
+        return "throughput below 90% of offered"
+    if frames["p95_ms"] > slo_ms:
+        return f"frame p95 over {slo_ms:.0f} ms"
+    if frames["error_rate"] > 0.01 or step["dashboards"]["error_rate"] > 0.01:
+        return "error rate over 1%"
+    return None
+
+
+def print_step(step):
+    f, d = step["frames"], step["dashboards"]
+    print(f"{step['cameras']:>7} {step['offered_frames_per_second']:>8.2f} {f['ok_per_second']:>8.2f} "
+          f"{f['p50_ms']:>8.1f} {f['p95_ms']:>8.1f} {f['p99_ms']:>8.1f} "
+          f"{d['ok_per_second']:>8.2f} {d['p95_ms']:>8.1f} {d['p99_ms']:>8.1f} "
+          f"{f['error_rate'] + d['error_rate']:>6.1%} {f['shed_rate']:>6.1%} {f['lock_rate'] + d['lock_rate']:>6.1%}",
+          flush=True)
+
+
+def encode_frames(frames):
+    encoded = []
+    for frame, _ in frames:
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            encoded.append("data:image/jpeg;base64," + base64.b64encode(buf).decode())
+    return encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ramp", default="1,2,4,8,16", help="camera counts to step through")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per step")
+    parser.add_argument("--fps", type=float, default=1 / 3, help="frames per second per camera")
+    parser.add_argument("--dashboards", type=int, default=10)
+    parser.add_argument("--poll", type=float, default=5, help="seconds between dashboard refreshes")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="frame p95 that counts as saturated")
+    parser.add_argument("--frames", help="directory of recorded frames")
+    parser.add_argument("--frame-count", type=int, default=30)
+    parser.add_argument("--gallery", type=int, default=200, help="synthetic students added to the gallery")
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--server", choices=["gunicorn", "asgi"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--url", help="test a running server instead of a throwaway one")
+    parser.add_argument("--admin-user", default=ADMIN_USER)
+    parser.add_argument("--admin-password", default=ADMIN_PASSWORD)
+    parser.add_argument("--keep", action="store_true", help="keep the temp directory")
+    parser.add_argument("--json", help="write the results here")
+    args = parser.parse_args()
+
+    workdir = None
+    proc = None
+    try:
+        if args.url:
+            base = args.url.rstrip("/")
+            wait_healthy(base, None)
+        else:
+            workdir = tempfile.mkdtemp(prefix="attendance-loadtest-")
+            names = prepare_data(workdir, args.gallery)
+            port = free_port()
+            base = f"http://127.0.0.1:{port}"
+            env = dict(os.environ, ADMIN_USER=args.admin_user, ADMIN_PASSWORD=args.admin_password,
+                       ARCHIVE_KEEP_MONTHS="0", WEB_THREADS=str(args.threads),
+                       # Cameras here are bounded by --fps, not by the per-client limiter
+                       RECOGNITION_RATE=os.environ.get("RECOGNITION_RATE", str(max(1.0, args.fps * 2))))
+            proc = start_server(workdir, args.server, port, args.workers, args.threads, env)
+            wait_healthy(base, proc)
+            rows = seed_history(os.path.join(workdir, "attendance.db"), names, args.history_days)
+            print(f"Throwaway instance in {workdir}: {len(names)} students, {rows} attendance rows")
+
+        frames = load_frames(args.frames) if args.frames else synthetic_frames(args.frame_count, ENCODING_FILE)
+        frames = encode_frames(frames)
+        if not frames:
+            raise SystemExit("No frames to send")
+
+        _, status, payload = request(base, "/api/login", {"role": "admin", "name": args.admin_user,
+                                                         "password": args.admin_password})
+        if status != 200:
+            raise SystemExit(f"Admin login failed ({status}): {payload[:200]!r}")
+        token = json.loads(payload)["token"]
+        request(base, "/start_attendance", {})
+
+        print(f"{'cameras':>7} {'offered':>8} {'frame/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'dash/s':>8} {'d p95':>8} {'d p99':>8} {'errors':>6} {'shed':>6} {'locked':>6}")
+        steps = []
+        saturation = None
+        for cameras in [int(c) for c in args.ramp.split(",") if c.strip()]:
+            step = run_step(base, token, frames, cameras, args)
+            steps.append(step)
+            print_step(step)
+            reason = saturated(step, args.slo_ms)
+            if reason:
+                saturation = {"cameras": cameras, "reason": reason}
+                break
+
+        best = max(steps, key=lambda s: s["frames"]["ok_per_second"])
+        print(f"\nSustained: {best['frames']['ok_per_second']} frames/s with {best['cameras']} cameras "
+              f"and {args.dashboards} dashboards")
+        if saturation:
+            print(f"Saturation point: {saturation['cameras']} cameras ({saturation['reason']})")
+        else:
+            print(f"Saturation point: not reached at {steps[-1]['cameras']} cameras")
+
+        request(base, "/stop_attendance", {})
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "steps": steps, "saturation": saturation}, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+from timetable import PERIODS, period_for_time
+
+
+def month_range(ym):
+    # Bounds that let "date BETWEEN" use the (date, time) index, unlike substr()
+    return f"{ym}-00", f"{ym}-99"
+
+
+def _resolve(name, roster, index):
+    upper = name.upper()
+    if upper in index:
+        return index[upper]
+    # Same loose match the dashboard uses, so "SRIRAM" lands on "SRIRAM S"
+    for i, n in enumerate(roster):
+        if n.startswith(upper + " ") or upper.startswith(n + " "):
+            index[upper] = i
+            return i
+    index[upper] = len(roster)
+    roster.append(upper)
+    return index[upper]
+
+
+def attendance_grid(c, ym=None, table="attendance"):
+    """Roster x period grid for one month (or all history when ym is None).
+
+    Cells only exist for student-dates with at least one mark: ``mask`` has
+    bit ``p - 1`` set for each period p attended, and ``times`` holds the
+    latest mark of each set period in ascending period order, as the old
+    client-side report did.
+    """
+    c.execute("SELECT name FROM students ORDER BY id")
+    roster = []
+    index = {}
+    for (n,) in c.fetchall():
+        if n and n.upper() not in index:
+            index[n.upper()] = len(roster)
+            roster.append(n.upper())
+
+    if ym:
+        c.execute(f"SELECT name, date, time FROM {table} WHERE date BETWEEN ? AND ? ORDER BY date DESC, time DESC",
+                  month_range(ym))
+    else:
+        c.execute(f"SELECT name, date, time FROM {table} ORDER BY date DESC, time DESC")
+
+    dates = []
+    date_index = {}
+    cells = {}
+    for name, date, time in c.fetchall():
+        if not name or not date or not time:
+            continue
+        try:
+            p = period_for_time(time)
+        except ValueError:
+            continue
+        if date not in date_index:
+            date_index[date] = len(dates)
+            dates.append(date)
+        key = (date_index[date], _resolve(name, roster, index))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, {}]
+        bit = 1 << (p - 1)
+        if not cell[0] & bit:
+            cell[0] |= bit
+            cell[1][p] = time
+
+    return {
+        "month": ym,
+        "periods": PERIODS,
+        "roster": roster,
+        "dates": dates,
+        "cells": [[d, s, mask, [times[p] for p in sorted(times)]] for (d, s), (mask, times) in cells.items()],
+    }
+
+
+class GridCache:
+    """Serialized grids for closed months, which only change on admin edits."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(ym):
+        return bool(ym) and ym < datetime.now().strftime("%Y-%m")
+
+    def get(self, ym):
+        return self.entries.get(ym)
+
+    def put(self, ym, grid):
+        body = json.dumps(grid, separators=(",", ":"))
+        entry = (body, hashlib.sha256(body.encode("utf-8")).hexdigest()[:16])
+        if self.cacheable(ym):
+            with self.lock:
+                self.entries[ym] = entry
+        return entry
+
+    def invalidate(self, month=None):
+        with self.lock:
+            if month is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(month, None)
@@ -0,0 +1,299 @@
+import argparse
+import atexit
+import heapq
+import os
+import secrets
+import subprocess
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+
+class ShardStore:
+    """One slice of the face gallery, matched with a single matrix op per query."""
+
+    def __init__(self):
+        self.encodings = {}
+        self.lock = threading.Lock()
+        self.matrix = None
+
+    def put(self, encodings):
+        with self.lock:
+            self.encodings.update(encodings)
+            self.matrix = None
+
+    def pop(self, names):
+        with self.lock:
+            popped = {n: self.encodings.pop(n) for n in names if n in self.encodings}
+            self.matrix = None
+        return popped
+
+    def replace(self, encodings):
+        with self.lock:
+            self.encodings = dict(encodings)
+            self.matrix = None
+
+    def _stacked(self):
+        # Rebuilt lazily after writes; grouped by shape so stray encodings of
+        # a different size are skipped, as the single-process matcher did.
+        if self.matrix is None:
+            groups = {}
+            for n, e in self.encodings.items():
+                if hasattr(e, "shape"):
+                    groups.setdefault(e.shape, ([], []))
+                    groups[e.shape][0].append(n)
+                    groups[e.shape][1].append(e)
+            self.matrix = {shape: (names, np.stack(encs)) for shape, (names, encs) in groups.items()}
+        return self.matrix
+
+    def top_k(self, queries, k):
+        with self.lock:
+            stacked = self._stacked()
+        results = []
+        for q in queries:
+            entry = stacked.get(getattr(q, "shape", None))
+            if entry is None:
+                results.append([])
+                continue
+            names, matrix = entry
+            dists = np.linalg.norm(matrix - q, axis=1)
+            idx = np.argsort(dists)[:k]
+            results.append([(float(dists[i]), names[i]) for i in idx])
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {"students": len(self.encodings),
+                    "bytes": int(sum(getattr(e, "nbytes", 0) for e in self.encodings.values()))}
+
+
+def _handle(conn, store):
+    try:
+        while True:
+            op, *args = conn.recv()
+            if op == "query":
+                conn.send(store.top_k(*args))
+            elif op == "put":
+                store.put(*args)
+                conn.send(True)
+            elif op == "pop":
+                conn.send(store.pop(*args))
+            elif op == "replace":
+                store.replace(*args)
+                conn.send(True)
+            elif op == "stats":
+                conn.send(store.stats())
+            else:
+                conn.send(ValueError(f"Unknown shard op: {op}"))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def serve(address, authkey):
+    """Run one shard until killed, one thread per coordinator connection."""
+    store = ShardStore()
+    with Listener(address, authkey=authkey) as listener:
+        print(f"DEBUG: Recognition shard listening on {listener.address[0]}:{listener.address[1]}", flush=True)
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_handle, args=(conn, store), daemon=True).start()
+
+
+def _exit_with_parent():
+    # Local shards get a pipe on stdin; EOF means the app process is gone
+    sys.stdin.read()
+    os._exit(0)
+
+
+def start_local_shards(count):
+    """Start shard subprocesses on loopback; returns (addresses, authkey).
+
+    They run this file as a script, exactly like a remote shard, and exit
+    when the parent process does. Shards unpickle whatever an authenticated
+    peer sends, so each run gets a fresh random key rather than a default.
+    """
+    key = secrets.token_hex(32)
+    env = dict(os.environ, RECOGNITION_SHARD_KEY=key)
+    addresses = []
+    for _ in range(count):
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", "0", "--local"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True)
+        line = proc.stdout.readline()
+        proc.stdout.close()
+        host, _, port = line.split()[-1].rpartition(":")
+        addresses.append((host, int(port)))
+        atexit.register(proc.terminate)
+    return addresses, key.encode()
+
+
+def parse_addresses(value):
+    addresses = []
+    for item in value.split(","):
+        host, _, port = item.strip().rpartition(":")
+        if port:
+            addresses.append((host or "127.0.0.1", int(port)))
+    return addresses
+
+
+class ShardClient:
+    """Pooled connections to one shard so concurrent requests don't queue on a socket."""
+
+    def __init__(self, address, authkey):
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return Client(self.address, authkey=self.authkey)
+
+    def release(self, conn):
+        with self.lock:
+            self.idle.append(conn)
+
+    def request(self, *message):
+        conn = self.acquire()
+        try:
+            conn.send(message)
+            reply = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        self.release(conn)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+class ShardedGallery:
+    """Coordinator for a gallery partitioned across shard processes.
+
+    Each student lives on exactly one shard. New students go to the shard
+    with the fewest, and removals are followed by moving students off the
+    fullest shard until sizes differ by at most one. Queries are scattered
+    to every shard at once and the per-shard top-k lists merged.
+    """
+
+    def __init__(self, addresses, authkey, k=3):
+        self.shards = [ShardClient(a, authkey) for a in addresses]
+        self.k = k
+        self.placement = {}
+        self.lock = threading.Lock()
+
+    def _sizes(self):
+        sizes = [0] * len(self.shards)
+        for i in self.placement.values():
+            sizes[i] += 1
+        return sizes
+
+    def load(self, encodings):
+        """Replace every shard's slice with a fresh round-robin split."""
+        with self.lock:
+            slices = [{} for _ in self.shards]
+            self.placement = {}
+            for j, name in enumerate(sorted(encodings)):
+                i = j % len(self.shards)
+                slices[i][name] = encodings[name]
+                self.placement[name] = i
+            for shard, part in zip(self.shards, slices):
+                shard.request("replace", part)
+
+    def enroll(self, encodings):
+        with self.lock:
+            sizes = self._sizes()
+            batches = [{} for _ in self.shards]
+            for name, enc in encodings.items():
+                i = self.placement.get(name)
+                if i is None:
+                    i = min(range(len(sizes)), key=sizes.__getitem__)
+                    sizes[i] += 1
+                    self.placement[name] = i
+                batches[i][name] = enc
+            for shard, batch in zip(self.shards, batches):
+                if batch:
+                    shard.request("put", batch)
+
+    def remove(self, names):
+        with self.lock:
+            batches = [[] for _ in self.shards]
+            for name in names:
+                i = self.placement.pop(name, None)
+                if i is not None:
+                    batches[i].append(name)
+            for shard, batch in zip(self.shards, batches):
+                if batch:
+                    shard.request("pop", batch)
+            self._rebalance()
+
+    def _rebalance(self):
+        sizes = self._sizes()
+        while max(sizes) - min(sizes) > 1:
+            src = max(range(len(sizes)), key=sizes.__getitem__)
+            dst = min(range(len(sizes)), key=sizes.__getitem__)
+            move = (max(sizes) - min(sizes)) // 2
+            names = [n for n, i in self.placement.items() if i == src][:move]
+            moved = self.shards[src].request("pop", names)
+            self.shards[dst].request("put", moved)
+            for name in moved:
+                self.placement[name] = dst
+            sizes[src] -= len(moved)
+            sizes[dst] += len(moved)
+            print(f"DEBUG: Rebalanced {len(moved)} students from shard {src} to shard {dst}")
+
+    def search(self, queries):
+        """Top-k (distance, name) candidates per query across all shards."""
+        if not queries:
+            return []
+        # Scatter first, then gather, so the shards work in parallel
+        sent = []
+        try:
+            for shard in self.shards:
+                conn = shard.acquire()
+                sent.append((shard, conn))
+                conn.send(("query", queries, self.k))
+            replies = []
+            for shard, conn in sent:
+                replies.append(conn.recv())
+        except Exception:
+            for _, conn in sent:
+                conn.close()
+            raise
+        for shard, conn in sent:
+            shard.release(conn)
+        return [heapq.nsmallest(self.k, (c for reply in replies for c in reply[q]))
+                for q in range(len(queries))]
+
+    def status(self):
+        shards = []
+        for shard in self.shards:
+            try:
+                stats = shard.request("stats")
+            except Exception as e:
+                stats = {"error": str(e)}
+            shards.append({"address": f"{shard.address[0]}:{shard.address[1]}", **stats})
+        return {"top_k": self.k, "shards": shards}
+
+
+if __name__ == "__main__":
+    # Remote shard: RECOGNITION_SHARD_KEY=<long random secret> python shards.py
+    # --host 0.0.0.0 --port 7100, then list it in RECOGNITION_SHARD_ADDRESSES
+    # on the app server with the same key.
+    parser = argparse.ArgumentParser(description="Run one recognition shard")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7100)
+    parser.add_argument("--local", action="store_true", help="exit when stdin closes")
+    args = parser.parse_args()
+    if args.local:
+        threading.Thread(target=_exit_with_parent, daemon=True).start()
+    key = os.environ.get("RECOGNITION_SHARD_KEY")
+    if not key:
+        # Anyone holding the key can make the shard unpickle arbitrary data
+        raise SystemExit("RECOGNITION_SHARD_KEY must be set")
+    serve((args.host, args.port), key.encode())
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files smaller than this are not worth a Content-Encoding round trip
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+IMMUTABLE_MAX_AGE = 31536000
+
+ASSET_REF_RE = re.compile(r'((?:href|src)=")([^"?#:]+\.(?:css|js))(?:\?[^"]*)?(")')
+
+
+class StaticAsset:
+    def __init__(self, path, body, mimetype):
+        self.path = path
+        self.mimetype = mimetype
+        self.set_body(body)
+
+    def set_body(self, body):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.variants["gzip"] = gz
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.variants["br"] = br
+
+    @property
+    def is_html(self):
+        return self.mimetype == "text/html"
+
+
+class StaticManifest:
+    """Frontend files loaded once at startup, keyed by their URL path.
+
+    HTML pages get their css/js references rewritten to ``?v=<content hash>``
+    so those assets can be cached forever, while the pages themselves are
+    revalidated with an ETag on every load.
+    """
+
+    def __init__(self, root, max_age=3600):
+        self.root = root
+        self.max_age = max_age
+        self.assets = {}
+        self.build()
+
+    def build(self):
+        assets = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                with open(full, "rb") as f:
+                    assets[rel] = StaticAsset(rel, f.read(), mimetype)
+
+        # Version asset references inside the pages now that every digest is known
+        for asset in assets.values():
+            if asset.is_html:
+                asset.set_body(self._version_refs(asset.body.decode("utf-8"), asset.path, assets).encode("utf-8"))
+
+        self.assets = assets
+        print(f"DEBUG: Static manifest built with {len(assets)} files "
+              f"({'gzip+br' if brotli is not None else 'gzip'} variants)")
+
+    def _version_refs(self, html, page_path, assets):
+        base = os.path.dirname(page_path)
+
+        def repl(m):
+            ref = os.path.normpath(os.path.join(base, m.group(2))).replace(os.sep, "/")
+            target = assets.get(ref)
+            if target is None:
+                return m.group(0)
+            return f"{m.group(1)}{m.group(2)}?v={target.digest}{m.group(3)}"
+
+        return ASSET_REF_RE.sub(repl, html)
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def response(self, asset, req):
+        if asset.is_html:
+            cache_control = "no-cache"
+        elif req.args.get("v") == asset.digest:
+            cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            cache_control = f"public, max-age={self.max_age}"
+
+        encoding = next((e for e in ("br", "gzip") if e in asset.variants and e in req.accept_encodings), None)
+        # Each encoding is a different byte stream, so it gets its own strong ETag
+        etag = f"{asset.digest}-{encoding}" if encoding else asset.digest
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if req.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        return Response(asset.body, mimetype=asset.mimetype, headers=headers)
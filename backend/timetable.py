@@ -0,0 +1,17 @@
+# Eight one-hour periods starting at 08:00. Times outside the day wrap
+# around onto a period instead of being dropped, as the dashboard always did.
+PERIODS = 8
+FIRST_HOUR = 8
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def period_for_hour(hour):
+    return (hour - FIRST_HOUR) % PERIODS + 1
+
+
+def period_for_time(time_str):
+    return period_for_hour(int(time_str.split(':')[0]))
+
+
+def hour_for_period(period):
+    return FIRST_HOUR + period - 1
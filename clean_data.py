@@ -1,49 +1,45 @@
-import sqlite3
 import pickle
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from archive import connect
+from jobs import purge_student, write_encodings
 
 DB_FILE = "backend/attendance.db"
+ARCHIVE_FILE = "backend/data/attendance_archive.db"
 ENCODING_FILE = "backend/data/encodings.pkl"
 TARGET = "jacks"
 
 print(f"Starting cleanup for target '{TARGET}'...")
 
-# 1. Clean Database
+def update_encodings(mutate):
+    if not os.path.exists(ENCODING_FILE):
+        print("No encodings file found.")
+        return
+    with open(ENCODING_FILE, "rb") as f:
+        encodings = pickle.load(f)
+    before = set(encodings)
+    mutate(encodings)
+    write_encodings(ENCODING_FILE, encodings)
+    print(f"Deleted {len(before - set(encodings))} keys from encodings file: {sorted(before - set(encodings))}")
+
+def progress(rows, total=None):
+    if total is not None:
+        print(f"{total} attendance rows to delete.")
+    elif rows:
+        print(f"  ...deleted {rows} rows")
+
+# For a stopped app only: a running one keeps the student in memory (gallery,
+# roster, analytics, caches) and writes them back to encodings.pkl on its next
+# gallery update. Against a live instance use POST /api/jobs
+# {"type": "purge", "name": "<student>"} instead.
 try:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    c.execute("DELETE FROM students WHERE lower(name) = lower(?)", (TARGET,))
-    students_deleted = c.rowcount
-    
-    c.execute("DELETE FROM attendance WHERE lower(name) = lower(?)", (TARGET,))
-    attendance_deleted = c.rowcount
-    
-    conn.commit()
+    conn = connect(DB_FILE, ARCHIVE_FILE, timeout=30)
+    deleted = purge_student(conn, update_encodings, progress, TARGET)
     conn.close()
-    print(f"Deleted {students_deleted} from students table.")
-    print(f"Deleted {attendance_deleted} from attendance table.")
+    print(f"Deleted {deleted} from attendance table.")
 except Exception as e:
-    print(f"Database clean error: {e}")
-
-# 2. Clean Encodings
-if os.path.exists(ENCODING_FILE):
-    try:
-        with open(ENCODING_FILE, "rb") as f:
-            encodings = pickle.load(f)
-        
-        # Case insensitive removal
-        keys_to_delete = [k for k in encodings.keys() if k.lower() == TARGET.lower()]
-        for k in keys_to_delete:
-            del encodings[k]
-            
-        with open(ENCODING_FILE, "wb") as f:
-            pickle.dump(encodings, f)
-            
-        print(f"Deleted {len(keys_to_delete)} keys from encodings file: {keys_to_delete}")
-    except Exception as e:
-        print(f"Encodings clean error: {e}")
-else:
-    print("No encodings file found.")
+    print(f"Cleanup error: {e}")
 
 print("Cleanup complete.")
@@ -18,6 +18,10 @@ let output = null;
 let scanState = null;
 
 let attendanceInterval = null;
+// Identifies this tab to the server's per-client rate limiter
+const clientId = sessionStorage.getItem("clientId") || Math.random().toString(36).slice(2);
+sessionStorage.setItem("clientId", clientId);
+let scanDelayMs = 3000;
 let dashboardInterval = null;
 let mouseX = 0;
 let mouseY = 0;
@@ -61,13 +65,45 @@ function captureImage() {
   return canvas.toDataURL("image/jpeg");
 }
 
+// Browsers with the Shape Detection API find faces locally and send only
+// small face tiles; everyone else sends the full frame.
+const faceDetector = "FaceDetector" in window ? new window.FaceDetector({ fastMode: true }) : null;
+
+async function captureFaceTiles() {
+  if (!faceDetector) return null;
+  try {
+    const faces = await faceDetector.detect(canvas);
+    return faces.map(face => {
+      const { x, y, width, height } = face.boundingBox;
+      const tile = document.createElement("canvas");
+      tile.width = 100;
+      tile.height = 100;
+      tile.getContext("2d").drawImage(canvas, x, y, width, height, 0, 0, 100, 100);
+      return {
+        image: tile.toDataURL("image/jpeg", 0.9),
+        box: [Math.round(x), Math.round(y), Math.round(width), Math.round(height)]
+      };
+    });
+  } catch (_) {
+    return null;
+  }
+}
+
 async function captureAndMarkAttendance() {
   const image = captureImage();
-  const resp = await fetch(`${API_BASE}/attendance`, {
+  const tiles = await captureFaceTiles();
+  const resp = await fetch(`${API_BASE}/attendance${tiles?.length ? "/tiles" : ""}`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ image })
+    headers: { "Content-Type": "application/json", "X-Client-Id": clientId },
+    body: JSON.stringify(tiles?.length ? { tiles } : { image })
   });
+
+  // Back off when the server is busy, using its hints for the next capture
+  const retryAfter = parseFloat(resp.headers.get("Retry-After"));
+  const suggested = parseFloat(resp.headers.get("X-Suggested-Interval"));
+  if (retryAfter) scanDelayMs = retryAfter * 1000;
+  else if (suggested) scanDelayMs = Math.max(3000, suggested * 1000);
+
   const recognizedData = await resp.json();
   if (!resp.ok) throw new Error(recognizedData.message || "Attendance mark failed");
 
@@ -94,13 +130,15 @@ async function startAttendance() {
 
     await captureAndMarkAttendance();
     if (!attendanceInterval) {
-      attendanceInterval = setInterval(async () => {
+      const scan = async () => {
         try {
           await captureAndMarkAttendance();
         } catch (_) {
           // Continue scanning loop.
         }
-      }, 3000);
+        if (attendanceInterval) attendanceInterval = setTimeout(scan, scanDelayMs);
+      };
+      attendanceInterval = setTimeout(scan, scanDelayMs);
     }
   } catch (err) {
     showMessage(err.message || err, true);
@@ -114,7 +152,7 @@ async function stopAttendance() {
     showMessage(data.message || "Attendance stopped");
     setScanState(false);
     if (attendanceInterval) {
-      clearInterval(attendanceInterval);
+      clearTimeout(attendanceInterval);
       attendanceInterval = null;
     }
   } catch (err) {
@@ -354,11 +392,32 @@ async function saveStudentUpdate() {
     showMessage(data.message || "Student updated");
     await renderProfileByName(searchName, "profile-result");
     await loadReport(getSelectedMonth());
+
+    // The profile is renamed already; attendance history follows in a job
+    if (data.job_id && await waitForJob(data.job_id)) {
+      showMessage("Attendance history moved to " + searchName);
+      await renderProfileByName(searchName, "profile-result");
+      await loadReport(getSelectedMonth());
+    }
   } catch (err) {
     showMessage(err.message || err, true);
   }
 }
 
+async function waitForJob(jobId, intervalMs = 1000) {
+  // Job status needs the admin session token; without it, leave the job be
+  if (!jwtToken) return false;
+  const headers = { "Authorization": "Bearer " + jwtToken };
+  while (true) {
+    const res = await fetch(`${API_BASE}/api/jobs/${jobId}`, { headers });
+    if (!res.ok) return false;
+    const { job } = await res.json();
+    if (job.status === "done") return true;
+    if (job.status === "failed") throw new Error(job.message || "Background update failed");
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
 async function saveDailyAttendance(oldDate, newDate, newTime, present) {
   const name = document.getElementById("edit-current-name")?.value?.trim();
   if (!name) {
@@ -416,19 +475,6 @@ const CLASS_LIST = [
   "VEERALAKSHMI N", "VISHWAATHIGA N M", "VIYANSA MERCY S", "YASWANTHINI M M"
 ];
 
-function getPeriodIndex(timeStr) {
-  const hour = parseInt(timeStr.split(':')[0], 10);
-  if (hour === 8) return 1;
-  if (hour === 9) return 2;
-  if (hour === 10) return 3;
-  if (hour === 11) return 4;
-  if (hour === 12) return 5;
-  if (hour === 13) return 6;
-  if (hour === 14) return 7;
-  if (hour === 15) return 8;
-  return (hour % 8) + 1; // fallback
-}
-
 function formatTimeAMPM(timeStr) {
   if (!timeStr) return "-";
   let [h, m] = timeStr.split(':');
@@ -442,60 +488,50 @@ async function loadReport(month) {
   const tbody = document.querySelector("#table tbody");
   if (!tbody) return;
   try {
-    const url = month ? `${API_BASE}/report/month/${month}` : `${API_BASE}/report`;
+    // The server returns the roster x period grid precomputed
+    const url = month ? `${API_BASE}/report/month/${month}/grid` : `${API_BASE}/report/grid`;
     const res = await fetch(url);
-    const rows = await res.json();
+    const grid = await res.json();
+    if (!res.ok) throw new Error(grid.message || "Could not load report");
 
+    // Merge the server roster into the class list once, remembering where each entry landed
     let dynamicClassList = [...CLASS_LIST];
-    try {
-      const studentRes = await fetch(`${API_BASE}/students`);
-      if (studentRes.ok) {
-        const studentData = await studentRes.json();
-        studentData.forEach(s => {
-          const upperName = s.name.toUpperCase();
-          // Smarter duplicate check to ignore missing initials
-          const existingMatch = dynamicClassList.find(n => n === upperName || n.startsWith(upperName + " ") || upperName.startsWith(n + " "));
-          if (!existingMatch) {
-            dynamicClassList.push(upperName);
-          }
-        });
-      }
-    } catch (e) { console.error("Could not fetch students", e); }
+    const rosterNames = grid.roster.map(upperName => {
+      // Smarter duplicate check to ignore missing initials
+      const existingMatch = dynamicClassList.find(n => n === upperName || n.startsWith(upperName + " ") || upperName.startsWith(n + " "));
+      if (existingMatch) return existingMatch;
+      dynamicClassList.push(upperName);
+      return upperName;
+    });
 
     tbody.innerHTML = "";
 
-    // Group logs by Date
-    // Each date contains an attendance map of 62 students -> 8 periods
+    // Group cells by Date
+    // Each date contains an attendance map of students -> 8 periods
     const datesMap = {};
+    const emptyDay = () => {
+      const day = {};
+      dynamicClassList.forEach(n => day[n] = {});
+      return day;
+    };
 
     // Always show today's empty roster if viewing recent reports (no month filter)
     if (!month) {
       const todayStr = new Date().toLocaleDateString('en-CA'); // Local YYYY-MM-DD
-      datesMap[todayStr] = {};
-      dynamicClassList.forEach(n => datesMap[todayStr][n.toUpperCase()] = { 1: null, 2: null, 3: null, 4: null, 5: null, 6: null, 7: null, 8: null });
+      datesMap[todayStr] = emptyDay();
     }
 
-    rows.forEach(row => {
-      const name = row[0];
-      const dateStr = row[1];
-      const timeStr = row[2];
-
-      if (!datesMap[dateStr]) {
-        datesMap[dateStr] = {};
-        dynamicClassList.forEach(n => datesMap[dateStr][n.toUpperCase()] = { 1: null, 2: null, 3: null, 4: null, 5: null, 6: null, 7: null, 8: null });
-      }
-
-      const period = getPeriodIndex(timeStr);
-      let studentNameUpper = Object.keys(datesMap[dateStr]).find(n => n === name.toUpperCase() || n.startsWith(name.toUpperCase() + " ") || name.toUpperCase().startsWith(n + " "));
-
-      if (!studentNameUpper) {
-        studentNameUpper = name.toUpperCase();
-        datesMap[dateStr][studentNameUpper] = { 1: null, 2: null, 3: null, 4: null, 5: null, 6: null, 7: null, 8: null };
-      }
+    grid.dates.forEach(dateStr => {
+      if (!datesMap[dateStr]) datesMap[dateStr] = emptyDay();
+    });
 
-      if (period >= 1 && period <= 8) {
-        if (!datesMap[dateStr][studentNameUpper][period]) {
-          datesMap[dateStr][studentNameUpper][period] = timeStr;
+    grid.cells.forEach(([dateIdx, studentIdx, mask, times]) => {
+      const records = datesMap[grid.dates[dateIdx]][rosterNames[studentIdx]];
+      let t = 0;
+      for (let p = 1; p <= grid.periods; p++) {
+        if (mask & (1 << (p - 1))) {
+          const timeStr = times[t++];
+          if (!records[p]) records[p] = timeStr;
         }
       }
     });